@@ -0,0 +1,310 @@
+# bench.py
+# 카피 경로 fan-out 벤치마크: 팔로워 1/10/100/1000 명일 때 신호 → 마지막 팔로워 응답 지연과 초당 주문 수.
+# 실제 거래소 대신 로컬 스텁(고정 지연)으로 주문이 나가며, server.py 의 ssh 는 로컬 셸로 대체해 curl 까지 그대로 실행한다.
+#
+#   python bench.py                                   # 전체 경로, 결과 → bench_results.json
+#   python bench.py --paths server,block_place --sizes 1,10,100 --latency-ms 20 --repeat 3 --out res.json
+#
+# 경로
+#   server       server.ssh_place_order           (ssh + 원격 curl, 서버별 배치/동시 fan-out)
+#   server_lanes server.FillDispatcher (lanes)    (실서비스 기본 경로: 레인 → 서버별 배치)
+#   block_place  block_follwers.place_order
+#   block_close  block_follwers.close_position    (팔로워마다 포지션 조회 후 청산)
+#   bittus       bittus_follower.order_all
+#   binance      followers.copy_trade_to_followers
+# 한 경로가 예상 시간(직전 크기 기준 선형 추정)이 --budget 초를 넘으면 그 이상 크기는 skipped 로 기록한다.
+import os, sys, json, time, shutil, tempfile, argparse, platform, threading, subprocess, statistics, contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ALL_PATHS = ["server", "server_lanes", "block_place", "block_close", "bittus", "binance"]
+
+# ---------- 로컬 스텁 거래소 ----------
+class StubExchange:
+    """Blockfin / Bitruth / Binance 선물에서 카피 경로가 쓰는 엔드포인트만, 요청마다 고정 지연 후 성공 응답"""
+    ORDER_PATHS = ("/api/v1/trade/order", "/fapi/order", "/fapi/v1/order")
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.acks: List[float] = []   # 주문 응답 시각 (monotonic)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def log_message(self, *a):
+                pass
+            def _reply(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                if n:
+                    self.rfile.read(n)
+                path = self.path.split("?", 1)[0]
+                time.sleep(stub.latency)
+                body = json.dumps(stub.route(self.command, path)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with stub.lock:
+                    stub.hits[path] = stub.hits.get(path, 0) + 1
+                    if self.command == "POST" and path in stub.ORDER_PATHS:
+                        stub.acks.append(time.monotonic())
+            do_GET = do_POST = do_DELETE = _reply
+
+        ThreadingHTTPServer.request_queue_size = 2048
+        ThreadingHTTPServer.daemon_threads = True
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def route(self, method: str, path: str):
+        now = int(time.time() * 1000)
+        # Blockfin
+        if path == "/api/v1/trade/order":
+            return {"code": "0", "msg": "", "data": [{"orderId": str(now), "code": "0", "msg": ""}]}
+        if path == "/api/v1/account/positions":
+            return {"code": "0", "msg": "", "data": [{"instId": "BTC-USDT", "marginMode": "cross", "positions": "1"}]}
+        # Bitruth
+        if path.endswith("/oauth/token"):
+            return {"access_token": "bench", "expires_in": 3600}
+        if path == "/fapi/instruments":
+            return {"data": [{"id": 1, "symbol": "ETHUSDT", "contractType": "USD_M"}]}
+        if path in ("/fapi/marginMode", "/fapi/order"):
+            return {"code": 0, "data": {"id": now}}
+        # Binance (spot ping/time + USDⓈ-M futures)
+        if path.endswith("/time"):
+            return {"serverTime": now}
+        if path.endswith("/exchangeInfo"):
+            return {"symbols": [{"symbol": "BTCUSDT", "filters": [{"filterType": "LOT_SIZE", "stepSize": "0.001",
+                                                                  "minQty": "0.001"}]}]}
+        if path.endswith("/ticker/price"):
+            return {"symbol": "BTCUSDT", "price": "100"}
+        if path.endswith("/leverage"):
+            return {"symbol": "BTCUSDT", "leverage": 5}
+        if path.endswith("/order"):
+            return {"orderId": now, "status": "NEW"}
+        return {}
+
+    def reset(self):
+        with self.lock:
+            self.hits.clear()
+            self.acks.clear()
+
+    def close(self):
+        self.httpd.shutdown()
+
+# server.py 의 ssh 를 로컬 실행으로: ssh 처럼 목적지 뒤 인자를 공백으로 이어 sh -c 로 실행
+LOCAL_SSH = """#!/usr/bin/env python3
+import os, sys
+a = sys.argv[1:]
+if "-O" in a or "-M" in a:
+    sys.exit(0)
+i = a.index("bash")
+os.execvp("sh", ["sh", "-c", " ".join(a[i:])])
+"""
+
+# ---------- 경로별 준비/실행 ----------
+class Path:
+    """setup(n) 으로 팔로워 n 명 구성 → run() 이 신호 1건 처리 (반환: 성공 수)"""
+    def __init__(self, name: str, setup: Callable[[int], None], run: Callable[[], Optional[int]]):
+        self.name, self.setup, self.run = name, setup, run
+
+def _write_json(path: str, obj):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+
+def build_paths(stub: StubExchange, work: str) -> Dict[str, Callable[[], Path]]:
+    """경로 이름 → Path 생성 함수 (import 는 실제로 돌릴 때만, 의존성 없으면 그 경로만 error)"""
+    fjson = os.path.join(work, "followers.json")
+
+    def server_path() -> Path:
+        import server
+        server.FOLLOWERS_JSON = fjson
+        server.SERVERS_JSON = os.path.join(work, "servers.json")
+        server.registry.followers.path = server.FOLLOWERS_JSON
+        server.registry.servers.path = server.SERVERS_JSON
+        n_servers = max(1, int(os.environ.get("BENCH_SERVERS", "10")))
+        def setup(n):
+            k = min(n, n_servers)
+            _write_json(server.SERVERS_JSON, {"servers": [{"name": f"s{j}", "host": "127.0.0.1"} for j in range(k)]})
+            _write_json(fjson, [{"id": f"b{i}", "name": f"s{i % k}", "key": f"k{i}", "secret": "s", "passphrase": "p"}
+                                for i in range(n)])
+            server.registry.invalidate()
+        def run():
+            res = server.ssh_place_order("BTC-USDT", "cross", "buy", "market", None, 1)
+            return sum(1 for r in res if r.get("status") == 200)
+        return Path("server", setup, run)
+
+    def server_lanes_path() -> Path:
+        # 실서비스 기본 경로: FillDispatcher(DISPATCH_MODE=lanes) → 레인 → 서버별 배치
+        import asyncio, server
+        p = server_path()
+        server.DISPATCH_MODE = "lanes"
+        async def one():
+            d = server.FillDispatcher()
+            d.start()
+            d.submit(server.Fill(reduce_only=False, inst_id="BTC-USDT", side="buy", size="1", price=None,
+                                 margin_mode="cross", order_type="market", recv_ts=time.monotonic()))
+            await d.drain()
+            d.stop(); d.lanes.pool.shutdown(wait=False)
+        def run():
+            asyncio.run(one())
+            return None   # 결과는 로그로만 나오므로 스텁 주문 응답 수로 센다
+        return Path("server_lanes", p.setup, run)
+
+    def block_path(close: bool) -> Callable[[], Path]:
+        def make() -> Path:
+            import block_follwers
+            from config_cache import JsonFileCache
+            block_follwers.BASE_URL = stub.url
+            block_follwers._followers = JsonFileCache(fjson, block_follwers._parse_followers, {"list": [], "by_id": {}})
+            def setup(n):
+                _write_json(fjson, [{"id": i, "name": f"f{i}", "key": f"k{i}", "secret": "s", "passphrase": "p"}
+                                    for i in range(n)])
+                block_follwers._followers.invalidate()
+            def run():
+                if close:
+                    res = block_follwers.close_position(inst_id="BTC-USDT", size=1)
+                else:
+                    res = block_follwers.place_order(inst_id="BTC-USDT", marginMode="cross", side="buy",
+                                                     orderType="market", price=None, size=1)
+                return sum(1 for r in res if r.get("status") == 200)
+            return Path("block_close" if close else "block_place", setup, run)
+        return make
+
+    def bittus_path() -> Path:
+        import bittus_follower
+        from config_cache import JsonFileCache
+        bittus_follower.OAUTH_URL = stub.url + "/oauth/token"
+        bittus_follower.FAPI_BASE = stub.url + "/fapi/"
+        bittus_follower._followers = JsonFileCache(fjson, bittus_follower._parse_followers, [])
+        def setup(n):
+            _write_json(fjson, [{"gmail": f"u{i}@bench", "password": "pw", "client_secret": "cs"} for i in range(n)])
+            bittus_follower._followers.invalidate()
+        def run():
+            res = bittus_follower.order_all(symbol="ETHUSDT", quantity=1, side="BUY", margin_mode="CROSS", leverage=5)
+            return sum(1 for r in res if r.get("ok"))
+        return Path("bittus", setup, run)
+
+    def binance_path() -> Path:
+        from binance.client import Client
+        Client.API_URL = stub.url + "/api"
+        Client.FUTURES_URL = stub.url + "/fapi"
+        import followers
+        followers.PRICE_STREAM = False   # 실제 Binance 마크 가격 스트림 대신 스텁 티커
+        def setup(n):
+            followers.followers = [{"name": f"f{i}", "api_key": f"bench{i}", "api_secret": "s", "multiplier": 1.0}
+                                   for i in range(n)]
+        def run():
+            followers.copy_trade_to_followers("BTCUSDT", "BUY", "BOTH", 1.0, 100.0, 5, "Cross")
+            return None   # 반환값이 없으므로 스텁 주문 응답 수로 센다
+        return Path("binance", setup, run)
+
+    return {"server": server_path, "server_lanes": server_lanes_path, "block_place": block_path(False), "block_close": block_path(True),
+            "bittus": bittus_path, "binance": binance_path}
+
+# ---------- 측정 ----------
+def measure(stub: StubExchange, p: Path, n: int, repeat: int) -> Dict:
+    p.setup(n)
+    runs, acked, first, last, p50 = [], [], [], [], []
+    for _ in range(repeat):
+        stub.reset()
+        t0 = time.monotonic()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            ok = p.run()
+        dt = time.monotonic() - t0
+        acks = sorted(a - t0 for a in stub.acks)
+        runs.append(dt)
+        acked.append(ok if ok is not None else len(acks))
+        if acks:
+            first.append(acks[0]); last.append(acks[-1]); p50.append(acks[len(acks) // 2])
+    med = statistics.median(runs)
+    ms = lambda xs: round(statistics.median(xs) * 1000, 2) if xs else None
+    return {
+        "path": p.name, "followers": n, "repeat": repeat,
+        "total_ms": {"median": round(med * 1000, 2), "min": round(min(runs) * 1000, 2), "max": round(max(runs) * 1000, 2)},
+        "first_ack_ms": ms(first), "p50_ack_ms": ms(p50), "last_ack_ms": ms(last),
+        "acked": min(acked), "expected": n,
+        "orders_per_sec": round(statistics.median(acked) / med, 1) if med > 0 else None,
+        "stub_requests": dict(stub.hits),
+    }
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def main():
+    ap = argparse.ArgumentParser(description="copy-trade fan-out benchmark")
+    ap.add_argument("--paths", default=",".join(ALL_PATHS))
+    ap.add_argument("--sizes", default="1,10,100,1000")
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="스텁 거래소 요청당 고정 지연")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--budget", type=float, default=120.0, help="경로·크기 1회 예상 시간 상한(초), 넘으면 skip")
+    ap.add_argument("--out", default=os.path.join(ROOT, "bench_results.json"))
+    args = ap.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    names = [x.strip() for x in args.paths.split(",") if x.strip()]
+
+    stub = StubExchange(args.latency_ms)
+    work = tempfile.mkdtemp(prefix="bench-")
+    ssh = os.path.join(work, "localssh")
+    with open(ssh, "w") as f:
+        f.write(LOCAL_SSH)
+    os.chmod(ssh, 0o755)
+    # server.py 는 import 시점에 읽으므로 먼저 설정
+    os.environ["SSH_BIN"] = ssh
+    os.environ.setdefault("SSH_MUX", "0")
+    os.environ["BLOCKFIN_BASE_URL"] = stub.url
+    os.environ.setdefault("POSITION_REFRESH_SEC", "0")
+
+    makers = build_paths(stub, work)
+    results: List[Dict] = []
+    for name in names:
+        if name not in makers:
+            print(f"[BENCH] unknown path: {name}"); continue
+        try:
+            p = makers[name]()
+        except Exception as e:
+            print(f"[BENCH] {name}: 준비 실패 → {type(e).__name__}: {e}")
+            results.append({"path": name, "error": f"{type(e).__name__}: {e}"}); continue
+        prev: Optional[Tuple[int, float]] = None
+        for n in sizes:
+            if prev and prev[1] * n / prev[0] > args.budget:
+                print(f"[BENCH] {name} n={n}: skipped (예상 {prev[1] * n / prev[0]:.0f}s > budget {args.budget:.0f}s)")
+                results.append({"path": name, "followers": n, "skipped": "budget"}); continue
+            try:
+                r = measure(stub, p, n, args.repeat)
+            except Exception as e:
+                print(f"[BENCH] {name} n={n}: error {type(e).__name__}: {e}")
+                results.append({"path": name, "followers": n, "error": f"{type(e).__name__}: {e}"}); break
+            results.append(r)
+            prev = (n, r["total_ms"]["median"] / 1000)
+            print(f"[BENCH] {name:<11} n={n:<5} total={r['total_ms']['median']:>10.1f}ms  last_ack={r['last_ack_ms']}ms  "
+                  f"orders/s={r['orders_per_sec']}  acked={r['acked']}/{n}")
+
+    out = {
+        "meta": {"ts": int(time.time()), "git": _git_rev(), "python": platform.python_version(),
+                 "platform": platform.platform(), "latency_ms": args.latency_ms, "repeat": args.repeat,
+                 "sizes": sizes, "env": {k: os.environ[k] for k in sorted(os.environ)
+                                         if k.startswith(("FANOUT_", "FORWARD_", "DISPATCH_", "SSH_MUX", "BENCH_"))}},
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, indent=2)
+    print(f"[BENCH] results → {args.out}")
+    stub.close()
+    try:
+        if "server" in sys.modules:
+            sys.modules["server"].stop_agents()
+    except Exception:
+        pass
+    shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,21 @@ from dotenv import load_dotenv
 
 load_dotenv(dotenv_path=".env", override=True)
 
+# 아래 공용 모듈은 import 시점에 환경변수를 읽으므로 .env 로드 뒤에
+from config_cache import JsonFileCache, SETTINGS_TTL
+from instruments import instrument_index
+
 # ===== 고정 엔드포인트 =====
 OAUTH_URL  = "https://p-api.bitruth.com/api/v1/oauth/token"
 FAPI_BASE  = "https://f-api.bitruth.com/api/v1/"
 CLIENT_ID  = 7
 
+# "이미 적용됨" 에러 응답 → 실패가 아니라 캐시 갱신으로 처리.
+# 거래소 에러 코드(MARGIN_ALREADY_CODES, 콤마 구분)가 우선이고, 코드가 없을 때만 아래 문구 전체 일치로 본다
+# ("already" 한 단어는 "position already exists" 같은 진짜 실패도 걸리므로 쓰지 않는다)
+MARGIN_ALREADY_CODES = {c.strip() for c in os.getenv("MARGIN_ALREADY_CODES", "").split(",") if c.strip()}
+_ALREADY_MESSAGES = ("margin mode already set", "leverage already set", "no need to change", "not modified")
+
 ROOT = os.path.dirname(os.path.abspath(__file__))
 FOLLOWERS_JSON = os.path.join(ROOT, "followers.json")
 
@@ -18,7 +28,32 @@ FOLLOWERS_JSON = os.path.join(ROOT, "followers.json")
 def _compact(d: Dict[str, Any]) -> Dict[str, Any]:
     return {k: v for k, v in d.items() if v is not None}
 
-def _load_followers() -> List[Dict[str, str]]:
+def _body_of(e: Exception) -> Dict[str, Any]:
+    resp = getattr(e, "response", None)
+    if resp is None:
+        return {}
+    try:
+        j = resp.json()
+        return j if isinstance(j, dict) else {}
+    except Exception:
+        return {"msg": getattr(resp, "text", "") or ""}
+
+def _res_ok(res: Any) -> bool:
+    """응답 바디의 성공 여부 (code 0/200 또는 success=true). 판단할 필드가 없으면 성공으로 보지 않는다"""
+    if not isinstance(res, dict):
+        return False
+    if "code" in res:
+        return str(res.get("code")) in ("0", "200")
+    return res.get("success") is True
+
+def _already_applied(body: Dict[str, Any]) -> bool:
+    code = body.get("code")
+    if code is not None and str(code) in MARGIN_ALREADY_CODES:
+        return True
+    msg = str(body.get("msg") or body.get("message") or "").lower()
+    return any(m in msg for m in _ALREADY_MESSAGES)
+
+def _parse_followers(arr) -> List[Dict[str, str]]:
     """
     followers.json 예시:
     [
@@ -26,21 +61,21 @@ def _load_followers() -> List[Dict[str, str]]:
       {"gmail":"user2@gmail.com","password":"pw2","client_secret":"yyyyy"}
     ]
     """
-    try:
-        with open(FOLLOWERS_JSON, "r", encoding="utf-8") as f:
-            arr = json.load(f)
-        out = []
-        for it in arr:
-            out.append({
-                "username": str(it.get("gmail") or ""),
-                "password": str(it.get("password") or ""),
-                "client_secret": str(it.get("client_secret") or ""),
-            })
-        return [a for a in out if a["username"] and a["password"] and a["client_secret"]]
-    except Exception:
-        return []
+    out = []
+    for it in arr:
+        out.append({
+            "username": str(it.get("gmail") or ""),
+            "password": str(it.get("password") or ""),
+            "client_secret": str(it.get("client_secret") or ""),
+        })
+    return [a for a in out if a["username"] and a["password"] and a["client_secret"]]
 
-@dataclass
+_followers = JsonFileCache(FOLLOWERS_JSON, _parse_followers, [])
+
+def _load_followers() -> List[Dict[str, str]]:
+    return _followers.get()
+
+@dataclass(frozen=True)
 class AuthInfo:
     username: str
     password: str
@@ -52,6 +87,9 @@ class BitruthClient:
         self.session = requests.Session()
         self._token: Optional[str] = None
         self._exp_ms: float = 0.0
+        # (symbol, contract_type) → ((MARGIN_MODE, leverage), 적용 시각)
+        # 같으면 /marginMode 를 다시 보내지 않는다 (SETTINGS_TTL 이 지나면 한 번 재적용)
+        self._margin_state: Dict[tuple, tuple] = {}
 
     # ---- 토큰/요청 공통 ----
     def _auth_headers(self) -> Dict[str, str]:
@@ -97,19 +135,18 @@ class BitruthClient:
 
     # ---- 인스트루먼트/마진 ----
     def get_instrument_id(self, symbol: str, contract_type: str = "USD_M") -> Optional[int]:
-        j = self._get("instruments")
-        data = j.get("data") or []
-        for it in data:
-            if str(it.get("symbol")) == symbol and str(it.get("contractType", "USD_M")) == contract_type:
-                try:
-                    return int(it.get("id"))
-                except:
-                    pass
-        print(f"[{self.auth.username}] [WARN] instrumentId not found for {symbol}/{contract_type}")
-        return None
+        # 공유 인덱스 조회 (비었거나 모르는 심볼일 때만 이 클라이언트 세션으로 /instruments 호출)
+        inst_id = instrument_index.get(symbol, contract_type, fetch=self._get)
+        if inst_id is None:
+            print(f"[{self.auth.username}] [WARN] instrumentId not found for {symbol}/{contract_type}")
+        return inst_id
 
     def set_margin_mode(self, symbol: str, margin_mode: str = "CROSS",
                         leverage: Union[int, str] = 5, contract_type: str = "USD_M") -> Optional[Dict[str, Any]]:
+        key, want = (symbol, contract_type), (str(margin_mode).upper(), str(leverage))
+        hit = self._margin_state.get(key)
+        if hit and hit[0] == want and time.time() - hit[1] < SETTINGS_TTL:
+            return None
         inst_id = self.get_instrument_id(symbol, contract_type)
         if inst_id is None:
             print(f"[{self.auth.username}] [ERROR] instrumentId not found → skip marginMode set")
@@ -119,8 +156,18 @@ class BitruthClient:
         try:
             res = self._post("/marginMode", body)
             print(f"[{self.auth.username}] [MARGIN RES]", res)
+            if _res_ok(res) or _already_applied(res):
+                self._margin_state[key] = (want, time.time())
+            else:
+                self._margin_state.pop(key, None)
+                print(f"[{self.auth.username}] [MARGIN WARN] not confirmed → not cached (continue)")
             return res
         except Exception as e:
+            if _already_applied(_body_of(e)):
+                self._margin_state[key] = (want, time.time())
+                print(f"[{self.auth.username}] [MARGIN] already in effect → cached")
+                return None
+            self._margin_state.pop(key, None)
             print(f"[{self.auth.username}] [MARGIN WARN] set fail → {e} (continue)")
             return None
 
@@ -155,7 +202,12 @@ class BitruthClient:
         }
         body = _compact(body)
         print(f"[{self.auth.username}] [ORDER] {body}")
-        res = self._post("/order", body)
+        try:
+            res = self._post("/order", body)
+        except Exception:
+            # 거래소 쪽 설정이 캐시와 달라졌을 수 있으니 다음 주문 때 다시 맞춘다
+            self._margin_state.pop((symbol, contract_type), None)
+            raise
         print(f"[{self.auth.username}] [ORDER RES]", res)
         return res
 
@@ -195,25 +247,35 @@ class BitruthClient:
         return res
 
 # ===== 클라이언트 로딩 (여러 계정) =====
+# followers.json 이 바뀔 때만 다시 만든다. 기존 계정의 클라이언트(세션/토큰)는 그대로 재사용.
+_clients: List["BitruthClient"] = []
+_clients_ver: Optional[int] = None
+_clients_by_auth: Dict[AuthInfo, "BitruthClient"] = {}
+
 def load_clients() -> List[BitruthClient]:
+    global _clients, _clients_ver, _clients_by_auth
     followers = _load_followers()
-    clients: List[BitruthClient] = []
-
-    if followers:
-        for f in followers:
-            auth = AuthInfo(username=f["username"], password=f["password"], client_secret=f["client_secret"])
-            clients.append(BitruthClient(auth))
-        return clients
-
-    # followers.json 없으면 환경변수 1계정 사용 (백워드 호환)
-    env_secret = os.getenv("BITURUS_SECRIT")
-    env_user   = os.getenv("GMAIL")
-    env_pass   = os.getenv("PASS")
-    if env_secret and env_user and env_pass:
-        clients.append(BitruthClient(AuthInfo(env_user, env_pass, env_secret)))
-        return clients
-
-    raise SystemExit("followers.json 이 비었고 환경변수(BITURUS_SECRIT/GMAIL/PASS)도 없습니다.")
+    if _clients and _clients_ver == _followers.version:
+        return _clients
+
+    auths: List[AuthInfo] = [AuthInfo(username=f["username"], password=f["password"], client_secret=f["client_secret"])
+                             for f in followers]
+    if not auths:
+        # followers.json 없으면 환경변수 1계정 사용 (백워드 호환)
+        env_secret = os.getenv("BITURUS_SECRIT")
+        env_user   = os.getenv("GMAIL")
+        env_pass   = os.getenv("PASS")
+        if env_secret and env_user and env_pass:
+            auths = [AuthInfo(env_user, env_pass, env_secret)]
+
+    if not auths:
+        raise SystemExit("followers.json 이 비었고 환경변수(BITURUS_SECRIT/GMAIL/PASS)도 없습니다.")
+
+    by_auth = {a: (_clients_by_auth.get(a) or BitruthClient(a)) for a in auths}
+    _clients = [by_auth[a] for a in auths]
+    _clients_by_auth = by_auth
+    _clients_ver = _followers.version
+    return _clients
 
 # ===== 브로드캐스트 헬퍼 =====
 def order_all(symbol: str, quantity: Union[float, str], *,
@@ -3,6 +3,8 @@ import os, time, json, requests
 from typing import Dict, Any, Optional, List
 from dotenv import load_dotenv
 from bittus_follower import order_all,close_position_all
+from poller import RestPositionSource, parse_ts_ms
+from instruments import instrument_index
 load_dotenv(dotenv_path=".env", override=True)
 
 # ===== 고정 엔드포인트/인증 (변경 금지) =====
@@ -15,7 +17,6 @@ PASSWORD      = os.getenv("PASS")
 if not (CLIENT_SECRET and USERNAME and PASSWORD):
     raise SystemExit("환경변수 CLIENT_SECRET(BITURUS_SECRIT), GMAIL, PASS 설정 필요")
 
-POLL_INTERVAL = float(os.getenv("POLL_INTERVAL", "0.8"))
 SYM_FILTER    = os.getenv("SYM")  # 예: ETHUSDT, 없으면 전체
 
 SESSION = requests.Session()
@@ -89,17 +90,21 @@ def pos_key(p: Dict[str, Any]) -> str:
         return f"PID:{pid}"
     return f"ACC:{p.get('accountId')}|SYM:{p.get('symbol')}|CT:{p.get('contractType')}"
 
+def qty_map(positions: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    return {k: _f(p.get("currentQty")) for k, p in positions.items()}
+
+def detect_lag_ms(prev: Dict[str, Dict[str, Any]], cur: Dict[str, Dict[str, Any]]) -> Optional[float]:
+    """바뀐 포지션들의 updatedAt 중 가장 이른 것 → 지금까지 걸린 ms (감지 지연). 시각이 없으면 None"""
+    pq, cq = qty_map(prev), qty_map(cur)
+    ts = [parse_ts_ms(p.get("updatedAt")) for k, p in cur.items() if pq.get(k) != cq[k]]
+    ts = [t for t in ts if t]
+    return time.time() * 1000 - min(ts) if ts else None
+
 def get_instrument_id(symbol: str, contract_type: str = "USD_M") -> Optional[int]:
-    j = get_json("instruments")
-    data = j.get("data") or []
-    for it in data:
-        if str(it.get("symbol")) == symbol and str(it.get("contractType", "USD_M")) == contract_type:
-            try:
-                return int(it.get("id"))
-            except Exception:
-                pass
-    print(f"[WARN] instrumentId not found for symbol={symbol} contractType={contract_type}")
-    return None
+    inst_id = instrument_index.get(symbol, contract_type, fetch=get_json)
+    if inst_id is None:
+        print(f"[WARN] instrumentId not found for symbol={symbol} contractType={contract_type}")
+    return inst_id
 
 def get_margin_mode(symbol: str, contract_type: str = "USD_M") -> Dict[str, Any]:
     """GET /api/v1/marginMode?instrumentId=... 로 현재 마진 모드/레버리지 조회"""
@@ -115,20 +120,21 @@ def get_margin_mode(symbol: str, contract_type: str = "USD_M") -> Dict[str, Any]
 if __name__ == "__main__":
     prev: Dict[str, Dict[str, Any]] = {}
     seeded = False
+    # 스냅샷 소스: 지금은 REST 적응형 폴링. WS/long-poll 소스로 바꿔도 아래 diff 는 그대로
+    source = RestPositionSource(lambda: fetch_positions(symbol=SYM_FILTER))
 
     try:
         while True:
             # 현재 스냅샷 수집
             try:
-                cur_list = fetch_positions(symbol=SYM_FILTER)
-                
+                cur_list = source.next()
             except requests.HTTPError as e:
                 msg = e.response.text[:300] if e.response is not None else str(e)
                 print(json.dumps({"error": "HTTP_POS", "msg": msg}, ensure_ascii=False), flush=True)
-                time.sleep(POLL_INTERVAL); continue
+                source.mark(False); continue
             except Exception as e:
                 print(json.dumps({"error": "GEN_POS", "msg": str(e)[:300]}, ensure_ascii=False), flush=True)
-                time.sleep(POLL_INTERVAL); continue
+                source.mark(False); continue
 
             cur: Dict[str, Dict[str, Any]] = {pos_key(p): p for p in cur_list}
 
@@ -136,8 +142,12 @@ if __name__ == "__main__":
             if not seeded:
                 prev = cur
                 seeded = True
-                time.sleep(POLL_INTERVAL)
+                source.mark(False)
                 continue
+            changed = qty_map(cur) != qty_map(prev)
+            lag = detect_lag_ms(prev, cur) if changed else None
+            if changed:
+                print(f"[POLL] 변화 감지 (interval={source.schedule.interval:.2f}s, lag={'%.0fms' % lag if lag is not None else '-'})", flush=True)
             EPS = float(os.getenv("QTY_EPS", "1e-10"))
             # ---- (1) 청산 감지: 이전엔 있었는데 지금 목록에서 사라짐 ----
             # ---- (2.5) 부분 변경 감지: 수량 감소/증가, 그리고 방향 전환까지 처리 ----
@@ -245,8 +255,8 @@ if __name__ == "__main__":
                     print(json.dumps(evt, ensure_ascii=False), flush=True)
                     print(f"[LOG] {evt['symbol']} {evt['side']} {evt['qty']} 진입 (entry={evt['entryPrice']})", flush=True)
 
-            # 스냅샷 교체
+            # 스냅샷 교체 + 스케줄 갱신 (변화 있으면 FAST, 없으면 백오프)
             prev = cur
-            time.sleep(POLL_INTERVAL)
+            source.mark(changed, lag)
     except KeyboardInterrupt:
         pass
@@ -10,6 +10,8 @@ from dotenv import load_dotenv
 import os
 from blofin.client import BloFinClient
 from blo_follwers import place_buy_order,place_sell_order
+from dedup import FillDedup
+import coalesce
 # 🔑 환경변수
 load_dotenv(dotenv_path=".env", override=True)
 API_KEY = os.getenv("MASTER_API_KEY_BLO")
@@ -18,6 +20,9 @@ PASSPHRASE = os.getenv("passphrase")
 
 client = BloFinClient(API_KEY, API_SECRET, PASSPHRASE)
 
+# (orderId, state, 체결) 단위 중복 제거. 재접속해도 유지되고, 크기 고정 LRU+TTL 이라 오래 돌려도 메모리가 늘지 않는다
+fill_dedup = FillDedup()
+
 def to_kst(ms_timestamp):
     dt = datetime.fromtimestamp(int(ms_timestamp) / 1000, tz=timezone.utc) + timedelta(hours=9)
     return dt.strftime("%Y-%m-%d %H:%M:%S")
@@ -55,6 +60,29 @@ def get_position_action(inst_id, side):
     except:
         return "동작 판별 실패"
 
+# ---- 팔로워 복사 (COALESCE_MS 동안 같은 종목/방향/진입·청산 체결은 합쳐서 1건) ----
+def copy_fill(fill, parts):
+    if len(parts) > 1:
+        print(f"[COALESCE] {fill['inst_id']} {fill['side']} {len(parts)}건 → size={fill['size']}")
+    kw = dict(inst_id=fill["inst_id"], size=fill["size"], price=fill["price"], marginMode=fill["marginMode"],
+              position_side=fill["position_side"], order_type=fill["order_type"])
+    if fill["entry"]:
+        place_buy_order(leverage=fill["leverage"], **kw)
+    else:
+        place_sell_order(**kw)
+
+def coalesce_key(fill):
+    # 지정가는 가격이 같은 것끼리만
+    limit = (fill["order_type"] or "market").lower() != "market"
+    return (fill["inst_id"], fill["side"], fill["entry"], fill["order_type"], fill["price"] if limit else None)
+
+def merge_fills(parts):
+    first = parts[0]
+    return {**first, "size": coalesce.sum_sizes([p["size"] for p in parts]),
+            "price": coalesce.vwap([(p["price"], p["size"]) for p in parts]) or first["price"]}
+
+coalescer = coalesce.Coalescer(coalesce.COALESCE_MS, merge_fills, copy_fill)
+
 async def listen_trades():
     uri = "wss://openapi.blofin.com/ws/private"
     async with websockets.connect(uri) as ws:
@@ -84,7 +112,6 @@ async def listen_trades():
         print("[✅] 주문 채널 구독 완료")
         asyncio.create_task(send_heartbeat(ws))
 
-        latest_status = {}
 
         while True:
             try:
@@ -97,9 +124,8 @@ async def listen_trades():
                         print(order)
                         order_id = order.get("orderId")
                         status = order.get("state", "").upper()
-                        if latest_status.get(order_id) == status:
+                        if fill_dedup.check(order):
                             continue
-                        latest_status[order_id] = status
 
                         inst_id = order.get("instId")
                         side = order.get("side", "N/A").upper()
@@ -126,6 +152,9 @@ async def listen_trades():
                         else: 
                             pos = "청산"    
                         if status == "FILLED":
+                            fill = {"inst_id": inst_id, "side": side, "size": qty, "price": price, "leverage": leverage,
+                                    "marginMode": marginMode, "position_side": positionSide, "order_type": order_type,
+                                    "entry": pos == "진입"}
                             if pos =="진입":
                                 print(f"\n[✅ 체결 완료] {to_kst(update_time)}")
                                 print(f"심볼       : {inst_id}")
@@ -133,7 +162,7 @@ async def listen_trades():
                                 print(f"수량(Qty)  : {qty} | 가격: {price}")
                                 print(f"배율:{leverage}")
                                 print(f"상태       : {status}")
-                                place_buy_order (inst_id= inst_id,size=qty, price = price,leverage=leverage,marginMode=marginMode,position_side=positionSide,order_type=order_type)   
+                                coalescer.add(inst_id, coalesce_key(fill), fill)
                             else:
                                 print(f"\n[✅ 체결 완료] {to_kst(update_time)}")
                                 print(f"심볼       : {inst_id}")
@@ -141,7 +170,7 @@ async def listen_trades():
                                 print(f"수량(Qty)  : {qty} | 가격: {aver}")
                                 print(f"아이디:{order_id}")
                                 print(f"상태       : {status}")
-                                place_sell_order(inst_id= inst_id,size=qty, price = price,marginMode=marginMode,position_side=positionSide,order_type=order_type)
+                                coalescer.add(inst_id, coalesce_key(fill), fill)
             except Exception as e:
                 print(f"[에러] WebSocket 수신 실패: {e}")
                 break
@@ -8,13 +8,17 @@ import websockets
 import os
 from dotenv import load_dotenv
 from block_follwers import place_order,close_position
+from dedup import FillDedup
 # ====== 환경 변수 ======
 load_dotenv(dotenv_path=".env", override=True)
 API_KEY = os.getenv("MASTER_API_KEY_BLO")
 API_SECRET = os.getenv("MASTER_API_SECRET_BLO")
 PASSPHRASE = os.getenv("passphrase")
 
-WS_URL = "wss://openapi.blockfin.com/ws/private"
+WS_URL = os.getenv("BLOCKFIN_WS_URL", "wss://openapi.blockfin.com/ws/private")
+
+# 재접속 후 같은 FILLED 가 다시 와도 한 번만 복사
+fill_dedup = FillDedup()
 
 # ====== 로그인 서명 생성 ======
 def sign_websocket_login(secret: str):
@@ -83,6 +87,9 @@ async def listen_orders():
 
                     # 포지션 방향 및 액션 구분
                     if order_state == "FILLED":
+                        if fill_dedup.check(order):
+                            print(f"[DEDUP] 중복 체결 무시: {inst_id} orderId={order.get('orderId')}")
+                            continue
                         if reduce_only == "true":
                             action = "청산"
                             close_position(inst_id = inst_id, size = size)
@@ -1,35 +1,41 @@
 # block_follwers.py
 import os, time, hmac, json, base64, hashlib, requests
 from typing import List, Dict, Optional, Tuple
+from config_cache import JsonFileCache
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
 FOLLOWERS_JSON = os.path.join(ROOT, "followers.json")
-BASE_URL = "https://openapi.blockfin.com"
+BASE_URL = os.environ.get("BLOCKFIN_BASE_URL", "https://openapi.blockfin.com")
 
 # -------- followers.json 로드 --------
+def _parse_followers(arr) -> Dict:
+    out=[]
+    for it in arr:
+        # id는 숫자/문자 상관없이 문자열로 보관
+        out.append({
+            "id": str(it.get("id") or ""),
+            "name": it.get("name") or "",
+            "key": it.get("key") or "",
+            "secret": it.get("secret") or "",
+            "passphrase": it.get("passphrase") or "",
+        })
+    by_id: Dict[str, List[Dict]] = {}
+    for f in out:
+        by_id.setdefault(f["id"], []).append(f)
+    return {"list": out, "by_id": by_id}
+
+# 한 번 파싱해 두고 파일이 바뀔 때만 다시 읽는다 (주문마다 json.load 하지 않음)
+_followers = JsonFileCache(FOLLOWERS_JSON, _parse_followers, {"list": [], "by_id": {}},
+                           on_error=lambda e: print(f"[WARN] followers.json 로드 실패: {e}"))
+
 def _load_followers() -> List[Dict]:
-    try:
-        arr = json.load(open(FOLLOWERS_JSON, "r", encoding="utf-8"))
-        out=[]
-        for it in arr:
-            # id는 숫자/문자 상관없이 문자열로 보관
-            out.append({
-                "id": str(it.get("id") or ""),
-                "name": it.get("name") or "",
-                "key": it.get("key") or "",
-                "secret": it.get("secret") or "",
-                "passphrase": it.get("passphrase") or "",
-            })
-        return out
-    except Exception as e:
-        print(f"[WARN] followers.json 로드 실패: {e}")
-        return []
+    return _followers.get()["list"]
 
 def _pick_targets(follower_id: Optional[str]) -> List[Dict]:
-    flw = _load_followers()
+    cfg = _followers.get()
     if follower_id:
-        return [f for f in flw if f.get("id")==str(follower_id)]
-    return flw
+        return cfg["by_id"].get(str(follower_id), [])
+    return cfg["list"]
 
 # -------- Blockfin 시그니처 --------
 def _sign(secret_key: str, method: str, path: str, body: Optional[dict]) -> Tuple[str,str,str]:
@@ -0,0 +1,136 @@
+# config_cache.py
+# followers.json / servers.json 같은 설정 파일을 한 번만 파싱해 메모리에 들고 있는 캐시.
+# 주문 hot path 에서는 파일을 읽지 않는다. 변경 감지는 mtime/size 를 CHECK_INTERVAL 마다 한 번만 stat,
+# 저장 API 처럼 우리가 직접 쓴 경우엔 invalidate() 로 즉시 반영.
+# RefreshingIndex 는 거래소 목록(심볼 필터, instrumentId 등)을 받아 dict 로 들고 있는 공용 인덱스.
+import os, json, time, threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+CHECK_INTERVAL = float(os.environ.get("CONFIG_CHECK_INTERVAL", "2"))
+MISS_SEC = 30   # 모르는 키로 인한 재조회 최소 간격 (신규 상장 대응 + 오타 심볼 폭주 방지)
+
+# 팔로워 계정 설정(레버리지/마진모드) 캐시 유지 시간 — Binance(followers.py) / Bitruth(bittus_follower.py) 공용
+SETTINGS_TTL = float(os.environ.get("SETTINGS_TTL", "3600"))
+
+class JsonFileCache:
+    """
+    path 의 JSON 을 parse(raw) 로 가공한 값을 캐시한다.
+    - 파일이 없거나 파싱 실패 → default (실패 시 이전 값이 있으면 유지)
+    - version 은 내용이 바뀔 때마다 1씩 증가 (파생 인덱스 재계산 판단용)
+    """
+    def __init__(self, path: str, parse: Callable[[Any], Any], default: Any,
+                 check_interval: float = CHECK_INTERVAL, on_error: Optional[Callable[[Exception], None]] = None):
+        self.path = path
+        self.parse = parse
+        self.default = default
+        self.check_interval = check_interval
+        self.on_error = on_error
+        self.version = 0
+        self._value: Any = default
+        self._sig: Optional[Tuple[int, int]] = None
+        self._checked_at = float("-inf")
+        self._loaded = False
+        self._force = False
+        self._lock = threading.Lock()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _reload(self, sig: Optional[Tuple[int, int]]):
+        if sig is None:
+            value = self.default
+        else:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    value = self.parse(json.load(f))
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+                value = self._value if self._loaded else self.default
+        self._value = value
+        self._sig = sig
+        self._loaded = True
+        self._force = False
+        self.version += 1
+
+    def get(self) -> Any:
+        now = time.monotonic()
+        if self._loaded and not self._force and (now - self._checked_at) < self.check_interval:
+            return self._value
+        with self._lock:
+            if not self._loaded or self._force or (now - self._checked_at) >= self.check_interval:
+                sig = self._stat()
+                if not self._loaded or self._force or sig != self._sig:
+                    self._reload(sig)
+                self._checked_at = now
+            return self._value
+
+    def invalidate(self):
+        """다음 get() 에서 무조건 다시 stat/파싱"""
+        with self._lock:
+            self._force = True
+
+class RefreshingIndex:
+    """
+    load() → dict 를 들고 있는 인덱스.
+    - 처음 get() 때 비어 있으면 한 번 받아오고, 이후 refresh_sec 마다 백그라운드 스레드가 갱신
+    - 모르는 키는 miss_sec 간격으로만 즉시 재조회 (동시에 여러 스레드가 miss 해도 1회)
+    - seed() 로 디스크 등에서 미리 채워 두면 첫 조회도 왕복 없음
+    """
+    def __init__(self, name: str, load: Callable[[], Dict[Hashable, Any]], refresh_sec: float, miss_sec: float = MISS_SEC):
+        self.name = name
+        self.load = load
+        self.refresh_sec = refresh_sec
+        self.miss_sec = miss_sec
+        self.data: Dict[Hashable, Any] = {}
+        self.loaded_at = 0.0
+        self._tried_at = 0.0    # 마지막 조회 시도 (실패 포함) — miss 재조회 간격 기준
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def seed(self, data: Dict[Hashable, Any], loaded_at: float):
+        self.data, self.loaded_at = data, loaded_at
+
+    def refresh(self) -> bool:
+        self._tried_at = time.time()
+        try:
+            data = self.load()
+        except Exception as e:
+            print(f"[ERROR] {self.name} 갱신 실패: {e}")
+            return False
+        self.data, self.loaded_at = data, time.time()
+        print(f"[✅ {self.name}] {len(data)}개 갱신")
+        return True
+
+    def _loop(self):
+        while True:
+            time.sleep(max(self.miss_sec, self.loaded_at + self.refresh_sec - time.time()))
+            self.refresh()
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    if not self.data:
+                        self.refresh()
+                    self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def get(self, key: Hashable) -> Any:
+        self.start()
+        v = self.data.get(key)
+        if v is None and time.time() - self._tried_at > self.miss_sec:
+            with self._lock:
+                # 다른 스레드가 방금 갱신했으면 다시 받지 않는다
+                v = self.data.get(key)
+                if v is None and time.time() - self._tried_at > self.miss_sec:
+                    self.refresh()
+                    v = self.data.get(key)
+        return v
+
+    def __len__(self) -> int:
+        return len(self.data)
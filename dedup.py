@@ -0,0 +1,61 @@
+# dedup.py
+# 마스터 체결 중복 제거. 재접속 직후 재전송되거나 두 번 온 FILLED 프레임으로 같은 체결을 두 번 복사하지 않기 위함.
+# 키 = (orderId, state, fill id). OrderedDict 기반 LRU + TTL → 확인/기록 O(1), 메모리는 max_size 로 고정.
+import os, time, threading, collections
+from typing import Dict, Optional, Tuple
+
+DEDUP_SIZE = int(os.environ.get("DEDUP_SIZE", "10000"))   # 기억할 최대 키 수
+DEDUP_TTL = float(os.environ.get("DEDUP_TTL", "3600"))     # 마지막으로 본 뒤 이 시간(초)이 지나면 잊음
+
+Key = Tuple[str, str, str]
+
+def fill_key(order: Dict) -> Optional[Key]:
+    """orders 채널 항목 → (orderId, state, fill id). fill id 가 없으면 누적 체결 수량으로 구분 (부분체결마다 다름)"""
+    oid = order.get("orderId")
+    if not oid:
+        return None
+    fid = (order.get("tradeId") or order.get("fillId") or order.get("filledSize")
+           or order.get("accFillSz") or order.get("fillSz") or "")
+    return str(oid), str(order.get("state") or "").upper(), str(fid)
+
+class FillDedup:
+    """
+    seen(key) : 처음이면 기록하고 False, 이미 봤으면 True.
+    최근에 본 키가 항상 뒤에 있으므로 만료/초과분은 앞에서부터 잘라낸다.
+    """
+    def __init__(self, max_size: int = DEDUP_SIZE, ttl: float = DEDUP_TTL):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._items: "collections.OrderedDict[Key, float]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def seen(self, key: Optional[Key]) -> bool:
+        if key is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            dup = key in self._items
+            self._items[key] = now
+            self._items.move_to_end(key)
+            if dup:
+                self.hits += 1
+            elif len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+            return dup
+
+    def check(self, order: Dict) -> bool:
+        """orders 채널 항목 하나가 중복인지 (처음이면 기록)"""
+        return self.seen(fill_key(order))
+
+    def _expire(self, now: float):
+        items = self._items
+        while items:
+            k, ts = next(iter(items.items()))
+            if now - ts <= self.ttl:
+                break
+            items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -1,4 +1,5 @@
 from binance.client import Client
+from binance import ThreadedWebsocketManager
 from dotenv import load_dotenv
 import os 
 
@@ -30,67 +31,258 @@ def sync_binance_time_for_client(client):
 
 
 import math
+import threading
+from config_cache import RefreshingIndex, SETTINGS_TTL
 
-def copy_trade_to_followers(symbol, side, position_side, qty, price, leverage, margin_text):
-    
-    for follower in followers:
-        if follower["api_key"] == MASTER_API_KEY:
-            print(f"[SKIP] 자기 자신 계정 복사 방지: {follower.get('name','Unknown')}")
-            continue
-        client = Client(follower["api_key"], follower["api_secret"])
-        sync_binance_time_for_client(client)
+# 📌 심볼 필터 인덱스 (stepSize / tickSize / minQty / minNotional)
+# futures_exchange_info 는 전체 심볼 목록(수백 KB)이라 프로세스에서 한 번만 받아 심볼 → 필터 dict 로 들고 있는다.
+# 백그라운드에서 주기적으로 갱신하고, 모르는 심볼(신규 상장 등)만 즉시 1회 재조회한다.
+EXCHANGE_INFO_REFRESH_SEC = int(os.getenv("EXCHANGE_INFO_REFRESH_SEC", "3600"))
+
+class SymbolFilterIndex(RefreshingIndex):
+    def __init__(self):
+        super().__init__("심볼 필터", self._load, EXCHANGE_INFO_REFRESH_SEC)
+        self._client = None
+
+    def _load(self):
+        if self._client is None:
+            self._client = Client()   # exchangeInfo 는 공개 API
+        out = {}
+        for s in self._client.futures_exchange_info().get('symbols', []):
+            f = {x['filterType']: x for x in s.get('filters', [])}
+            lot = f.get('LOT_SIZE', {})
+            out[s['symbol'].upper()] = {
+                "stepSize": float(lot.get('stepSize') or 0),
+                "minQty": float(lot.get('minQty') or 0),
+                "tickSize": float(f.get('PRICE_FILTER', {}).get('tickSize') or 0),
+                "minNotional": float(f.get('MIN_NOTIONAL', {}).get('notional') or f.get('MIN_NOTIONAL', {}).get('minNotional') or 0),
+            }
+        return out
+
+    def get(self, symbol):
+        return super().get(symbol.upper())
 
+symbol_filters = SymbolFilterIndex()
+
+# 📌 팔로워 Client 풀 (API 키별로 한 번 만들어 계속 재사용 → 세션 keep-alive 유지, 체결마다 TLS/ping 없음)
+# 시간 오프셋은 거래소 시계 하나 기준이므로 백그라운드에서 get_server_time 1회로 전체 클라이언트에 반영한다.
+TIME_SYNC_SEC = int(os.getenv("TIME_SYNC_SEC", "600"))   # 시간 재동기화 주기(초). master.py 도 이 값을 쓴다
+
+class FollowerClientPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._offset = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def get(self, follower):
+        key = (follower["api_key"], follower["api_secret"])
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = Client(follower["api_key"], follower["api_secret"])
+                    if self._offset is None:
+                        sync_binance_time_for_client(client)
+                        self._offset = client.timestamp_offset
+                    client.timestamp_offset = self._offset
+                    self._clients[key] = client
+            self.start()
+        return client
+
+    def sync_all(self):
+        with self._lock:
+            clients = list(self._clients.values())
+        if not clients:
+            return
         try:
-            # 📌 마진 모드 변환
-            if "CROSS" in margin_text.upper():
-                margin_type_api = "CROSS"
-            else:
-                margin_type_api = "ISOLATED"
+            server_ts = int(clients[0].get_server_time()['serverTime'])
+            offset = server_ts - int(time.time() * 1000)
+        except Exception as e:
+            print(f"[ERROR] 시간 동기화 실패: {e}")
+            return
+        self._offset = offset
+        for c in clients:
+            c.timestamp_offset = offset
+
+    def _loop(self):
+        while True:
+            time.sleep(TIME_SYNC_SEC)
+            self.sync_all()
+
+    def start(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="follower-time-sync", daemon=True)
+                    self._thread.start()
+
+client_pool = FollowerClientPool()
+
+# 📌 마크 가격 캐시 (슬리피지 체크용)
+# 공개 선물 WS 의 전체 심볼 스트림(!markPrice@arr@1s) 하나를 받아 둔다 → 새 심볼이 나와도 소켓을 다시 열 필요가 없다.
+# 구독(웹소켓 시작)은 백그라운드 스레드에서만 하고, 복사 워커는 start() 만 부르고 바로 돌아간다.
+# PRICE_MAX_AGE 초보다 오래된 값이면 REST 티커로 대체하고, 그 값도 캐시에 넣어 다른 팔로워는 재사용한다.
+PRICE_MAX_AGE = float(os.getenv("PRICE_MAX_AGE", "3"))
+PRICE_STREAM = os.getenv("PRICE_STREAM", "1") == "1"   # 0 이면 스트림 없이 REST 티커만 (테스트넷/스텁/벤치용)
+PRICE_STREAM_RETRY_SEC = float(os.getenv("PRICE_STREAM_RETRY_SEC", "30"))   # 구독 실패 시 재시도 간격
+
+class MarkPriceCache:
+    STREAM = "!markPrice@arr@1s"
+
+    def __init__(self):
+        self._start_lock = threading.Lock()
+        self._prices = {}     # symbol → (price, 수신시각)
+        self._thread = None
+        self._twm = None
+        self._socket = None
+
+    def _on_msg(self, msg):
+        data = msg.get('data', msg) if isinstance(msg, dict) else msg
+        now = time.time()
+        for d in (data if isinstance(data, list) else [data]):
+            if isinstance(d, dict) and d.get('e') == 'markPriceUpdate':
+                self._prices[d['s'].upper()] = (float(d['p']), now)
+            elif isinstance(d, dict) and d.get('e') == 'error':
+                print(f"[WARN] 마크 가격 스트림 오류: {d}")
+
+    def _subscribe(self):
+        # 백그라운드 스레드 전용. 실패하면 PRICE_STREAM_RETRY_SEC 뒤 다시 (그동안 get() 은 REST 티커로)
+        while self._socket is None:
+            try:
+                if self._twm is None:
+                    self._twm = ThreadedWebsocketManager()
+                    self._twm.start()
+                self._socket = self._twm.start_futures_multiplex_socket(callback=self._on_msg, streams=[self.STREAM])
+                print(f"[✅ 마크 가격 구독] {self.STREAM}")
+            except Exception as e:
+                print(f"[ERROR] 마크 가격 구독 실패: {e}")
+                time.sleep(PRICE_STREAM_RETRY_SEC)
+
+    def start(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._subscribe, name="mark-price-sub", daemon=True)
+                    self._thread.start()
+
+    def get(self, symbol, client):
+        symbol = symbol.upper()
+        if PRICE_STREAM:
+            self.start()
+        hit = self._prices.get(symbol)
+        if hit and time.time() - hit[1] <= PRICE_MAX_AGE:
+            return hit[0]
+        price = float(client.futures_symbol_ticker(symbol=symbol)['price'])
+        self._prices[symbol] = (price, time.time())
+        return price
 
-            # 📌 레버리지 동기화
+mark_prices = MarkPriceCache()
+
+# 📌 팔로워별 레버리지/마진 상태 캐시 ((api_key, symbol) → 마지막으로 적용된 값)
+# 값이 같으면 change_leverage / change_margin_type 을 보내지 않는다. "No need to change" 도 적용된 것으로 기록.
+# 거래소에서 직접 바꾼 경우를 위해 SETTINGS_TTL 이 지나면 한 번 다시 보내고, 주문이 실패하면 해당 항목을 버린다.
+
+class AccountSettingsCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}   # (api_key, symbol, 항목) → (값, 기록시각)
+
+    def same(self, api_key, symbol, item, value):
+        hit = self._state.get((api_key, symbol.upper(), item))
+        return bool(hit) and hit[0] == value and time.time() - hit[1] < SETTINGS_TTL
+
+    def put(self, api_key, symbol, item, value):
+        with self._lock:
+            self._state[(api_key, symbol.upper(), item)] = (value, time.time())
+
+    def invalidate(self, api_key, symbol):
+        with self._lock:
+            for item in ("leverage", "margin"):
+                self._state.pop((api_key, symbol.upper(), item), None)
+
+account_settings = AccountSettingsCache()
+
+def copy_trade_to_follower(follower, symbol, side, position_side, qty, price, leverage, margin_text):
+    """팔로워 1명에게 복사. 주문까지 나가면 True"""
+    if follower["api_key"] == MASTER_API_KEY:
+        print(f"[SKIP] 자기 자신 계정 복사 방지: {follower.get('name','Unknown')}")
+        return False
+
+    try:
+        # Client() 생성은 네트워크 호출이 있어 실패할 수 있다
+        client = client_pool.get(follower)
+
+        # 📌 마진 모드 변환
+        if "CROSS" in margin_text.upper():
+            margin_type_api = "CROSS"
+        else:
+            margin_type_api = "ISOLATED"
+
+        # 📌 레버리지 동기화 (바뀐 경우만)
+        api_key = follower["api_key"]
+        follower_leverage = follower.get("leverage", leverage)
+        if not account_settings.same(api_key, symbol, "leverage", str(follower_leverage)):
             client.futures_change_leverage(
                 symbol=symbol,
-                leverage=follower.get("leverage", leverage)
+                leverage=follower_leverage
             )
+            account_settings.put(api_key, symbol, "leverage", str(follower_leverage))
 
-            # 📌 마진 모드 동기화
+        # 📌 마진 모드 동기화 (바뀐 경우만)
+        if not account_settings.same(api_key, symbol, "margin", margin_type_api):
             try:
                 client.futures_change_margin_type(symbol=symbol, marginType=margin_type_api)
+                account_settings.put(api_key, symbol, "margin", margin_type_api)
             except Exception as e:
-                if "No need to change" not in str(e):
+                if "No need to change" in str(e):
+                    account_settings.put(api_key, symbol, "margin", margin_type_api)
+                else:
                     print(f"[경고] 마진 모드 설정 실패: {follower.get('name','Unknown')} - {e}")
 
-            # 📌 LOT_SIZE 체크
-            info = client.futures_exchange_info()
-            symbol_info = next((s for s in info['symbols'] if s['symbol'].upper() == symbol.upper()), None)
-            if not symbol_info:
-                print(f"[ERROR] {symbol} 심볼 정보를 찾을 수 없습니다.")
-                continue
-
-            step_size = float(next(f['stepSize'] for f in symbol_info['filters'] if f['filterType'] == 'LOT_SIZE'))
-            follower_qty = math.floor(qty * follower["multiplier"] / step_size) * step_size
-
-            # 📌 가격 검증 & 슬리피지 체크
-            if price <= 0:
-                print(f"[ERROR] 가격이 유효하지 않습니다: {price}")
-                continue
-
-            current_price = float(client.futures_symbol_ticker(symbol=symbol)['price'])
-            slippage = abs(current_price - price) / price
-            if slippage > follower.get("slippage_limit", 0.005):
-                print(f"[SKIP] {symbol} 슬리피지 {slippage:.2%} > 제한 ({follower.get('slippage_limit',0.5)*100:.1f}%)")
-                continue
-
-            # 📌 주문 실행
-            order = client.futures_create_order(
-                symbol=symbol,
-                side=side,
-                type="MARKET",
-                quantity=follower_qty,
-                positionSide=position_side,
-            )
+        # 📌 LOT_SIZE 체크 (공용 인덱스, 네트워크 없음)
+        filters = symbol_filters.get(symbol)
+        if not filters or not filters["stepSize"]:
+            print(f"[ERROR] {symbol} 심볼 정보를 찾을 수 없습니다.")
+            return False
 
-            print(f"[✅ 카피 완료] {follower.get('name','Unknown')} - {symbol} {side} {follower_qty} @ {price} | {margin_type_api} | {leverage}배")
+        step_size = filters["stepSize"]
+        follower_qty = math.floor(qty * follower["multiplier"] / step_size) * step_size
+        if follower_qty < filters["minQty"]:
+            print(f"[SKIP] {symbol} 수량 {follower_qty} < 최소 {filters['minQty']}")
+            return False
 
-        except Exception as e:
-            print(f"[❌ 카피 실패] {follower.get('name','Unknown')} - {symbol} | 오류: {e}")
+        # 📌 가격 검증 & 슬리피지 체크
+        if price <= 0:
+            print(f"[ERROR] 가격이 유효하지 않습니다: {price}")
+            return False
+
+        current_price = mark_prices.get(symbol, client)
+        slippage = abs(current_price - price) / price
+        if slippage > follower.get("slippage_limit", 0.005):
+            print(f"[SKIP] {symbol} 슬리피지 {slippage:.2%} > 제한 ({follower.get('slippage_limit',0.5)*100:.1f}%)")
+            return False
+
+        # 📌 주문 실행
+        order = client.futures_create_order(
+            symbol=symbol,
+            side=side,
+            type="MARKET",
+            quantity=follower_qty,
+            positionSide=position_side,
+        )
+
+        print(f"[✅ 카피 완료] {follower.get('name','Unknown')} - {symbol} {side} {follower_qty} @ {price} | {margin_type_api} | {leverage}배")
+        return True
+
+    except Exception as e:
+        account_settings.invalidate(follower["api_key"], symbol)
+        print(f"[❌ 카피 실패] {follower.get('name','Unknown')} - {symbol} | 오류: {e}")
+        return False
+
+def copy_trade_to_followers(symbol, side, position_side, qty, price, leverage, margin_text):
+    
+    for follower in followers:
+        copy_trade_to_follower(follower, symbol, side, position_side, qty, price, leverage, margin_text)
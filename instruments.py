@@ -0,0 +1,69 @@
+# instruments.py
+# Bitruth (symbol, contractType) → instrumentId 인덱스. bittuth.py / BitruthClient 가 같이 쓴다.
+# 조회/갱신은 config_cache.RefreshingIndex (처음 1회 로드, INSTRUMENTS_REFRESH_SEC 마다 백그라운드 갱신, miss 시 재조회).
+# INSTRUMENTS_CACHE 경로를 주면 디스크에 저장 → 재시작 시 파일로 바로 시작 (오래됐으면 백그라운드에서 갱신)
+# /instruments 가 인증 필요라 fetch(path) 는 호출하는 쪽 세션(get_json / client._get)을 넘겨받는다.
+import os, json, time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config_cache import RefreshingIndex
+
+INSTRUMENTS_REFRESH_SEC = int(os.getenv("INSTRUMENTS_REFRESH_SEC", "3600"))
+INSTRUMENTS_CACHE = os.getenv("INSTRUMENTS_CACHE", "")   # 예: instruments_cache.json (비우면 저장 안 함)
+
+Key = Tuple[str, str]
+Fetch = Callable[[str], Dict[str, Any]]
+
+def _parse(data) -> Dict[Key, int]:
+    out = {}
+    for it in data or []:
+        try:
+            out[(str(it.get("symbol")), str(it.get("contractType", "USD_M")))] = int(it.get("id"))
+        except (TypeError, ValueError):
+            continue
+    return out
+
+class InstrumentIndex(RefreshingIndex):
+    def __init__(self, cache_path: str = INSTRUMENTS_CACHE):
+        super().__init__("instruments", self._load, INSTRUMENTS_REFRESH_SEC)
+        self.cache_path = cache_path
+        self._fetch: Optional[Fetch] = None
+        self._load_disk()
+
+    def _load(self) -> Dict[Key, int]:
+        if self._fetch is None:
+            raise RuntimeError("fetch 미지정")
+        data = self._fetch("instruments").get("data") or []
+        self._save_disk(data)
+        return _parse(data)
+
+    def _load_disk(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                j = json.load(f)
+            self.seed(_parse(j.get("data")), float(j.get("saved_at") or 0))
+            print(f"[✅ instruments] 디스크 캐시 {len(self)}개 로드")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[WARN] instruments 캐시 읽기 실패: {e}")
+
+    def _save_disk(self, data):
+        if not self.cache_path:
+            return
+        tmp = self.cache_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"saved_at": time.time(), "data": data}, f, ensure_ascii=False)
+            os.replace(tmp, self.cache_path)
+        except Exception as e:
+            print(f"[WARN] instruments 캐시 저장 실패: {e}")
+
+    def get(self, symbol: str, contract_type: str = "USD_M", fetch: Optional[Fetch] = None) -> Optional[int]:
+        if fetch is not None:
+            self._fetch = fetch   # 갱신은 가장 최근 호출자의 세션으로
+        return super().get((str(symbol), str(contract_type)))
+
+instrument_index = InstrumentIndex()
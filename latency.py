@@ -0,0 +1,132 @@
+# latency.py
+# 체결 신호 → 팔로워 주문 응답까지 단계별 지연 측정.
+# - Trace : 체결 1건 (trace_id, 체결 단위 타임스탬프)
+# - Span  : 그 체결을 처리하는 팔로워(들). 워커 스레드에 bind() 해두면
+#           _bf_sign / ssh 같은 하위 함수가 record() 만 호출해도 해당 팔로워로 집계된다.
+# - LatencyStats : 단계별 / 팔로워별 / 서버별 최근 샘플로 p50/p95/p99 계산
+import os, time, uuid, threading, collections
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+SAMPLES = int(os.environ.get("LATENCY_SAMPLES", "2048"))   # 히스토그램당 보관할 최근 샘플 수
+RECENT_TRACES = int(os.environ.get("LATENCY_RECENT", "50"))
+
+def now_ms() -> float:
+    return time.time() * 1000
+
+class Histogram:
+    """최근 N개 샘플(ms) 링버퍼. 조회 시에만 정렬하므로 기록은 O(1)."""
+    def __init__(self, size: int = SAMPLES):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms: float):
+        self.samples.append(ms)
+        self.count += 1
+        self.total += ms
+
+    def summary(self) -> Dict:
+        xs = sorted(self.samples)
+        if not xs:
+            return {"count": self.count}
+        def pct(p: float) -> float:
+            return round(xs[min(len(xs) - 1, int(p * len(xs)))], 2)
+        return {"count": self.count, "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99),
+                "max": round(xs[-1], 2), "mean": round(sum(xs) / len(xs), 2)}
+
+class LatencyStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Histogram] = collections.defaultdict(Histogram)
+        self.followers: Dict[str, Dict[str, Histogram]] = collections.defaultdict(lambda: collections.defaultdict(Histogram))
+        self.servers: Dict[str, Dict[str, Histogram]] = collections.defaultdict(lambda: collections.defaultdict(Histogram))
+        self.recent = collections.deque(maxlen=RECENT_TRACES)
+
+    def observe(self, stage: str, ms: float, follower: Optional[str] = None, server: Optional[str] = None):
+        with self._lock:
+            self.stages[stage].observe(ms)
+            if follower:
+                self.followers[follower][stage].observe(ms)
+            if server:
+                self.servers[server][stage].observe(ms)
+
+    def add_recent(self, item: Dict):
+        with self._lock:
+            self.recent.append(item)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "stages": {k: h.summary() for k, h in self.stages.items()},
+                "followers": {f: {k: h.summary() for k, h in st.items()} for f, st in self.followers.items()},
+                "servers": {s: {k: h.summary() for k, h in st.items()} for s, st in self.servers.items()},
+                "recent": list(self.recent),
+            }
+
+stats = LatencyStats()
+
+class Trace:
+    """체결 1건. stamp() 는 epoch ms 로 기록."""
+    def __init__(self, exch_ts: Optional[float] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.stamps: Dict[str, float] = {}
+        if exch_ts:
+            self.stamps["exchange"] = float(exch_ts)
+
+    def stamp(self, name: str, ts: Optional[float] = None):
+        self.stamps[name] = ts if ts is not None else now_ms()
+
+    def between(self, a: str, b: str) -> Optional[float]:
+        if a in self.stamps and b in self.stamps:
+            return self.stamps[b] - self.stamps[a]
+        return None
+
+    def observe_between(self, stage: str, a: str, b: str):
+        d = self.between(a, b)
+        if d is not None:
+            stats.observe(stage, d)
+
+class Span:
+    """trace + 대상 팔로워들 (서버 배치면 여러 명이 같은 측정값을 공유)"""
+    def __init__(self, trace: Optional[Trace], targets: List[str], server: Optional[str] = None):
+        self.trace = trace
+        self.targets = targets
+        self.server = server
+        self.marks: Dict[str, float] = {}
+
+    def record(self, stage: str, ms: float):
+        if self.trace is None:
+            # 체결과 무관한 호출(백그라운드 포지션 갱신 등)은 집계하지 않는다
+            return
+        self.marks[stage] = self.marks.get(stage, 0.0) + ms
+        for t in self.targets or [None]:
+            stats.observe(stage, ms, follower=t, server=self.server)
+
+_local = threading.local()
+
+def current() -> Optional[Span]:
+    return getattr(_local, "span", None)
+
+@contextmanager
+def bind(span: Optional[Span]):
+    prev = getattr(_local, "span", None)
+    _local.span = span
+    try:
+        yield span
+    finally:
+        _local.span = prev
+
+def record(stage: str, ms: float):
+    """현재 스레드에 bind 된 span 으로 기록 (bind 안 된 호출은 무시)"""
+    span = current()
+    if span is not None:
+        span.record(stage, ms)
+
+@contextmanager
+def timed(stage: str):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, (time.perf_counter() - t) * 1000)
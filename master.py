@@ -3,7 +3,13 @@ from binance.client import Client
 from dotenv import load_dotenv
 import os
 import time
-from followers import copy_trade_to_followers
+import json
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import followers as fw
+from followers import copy_trade_to_follower, TIME_SYNC_SEC
+from latency import Histogram
 
 # 1. 환경 변수 불러오기
 load_dotenv(dotenv_path=".env", override=True)
@@ -28,63 +34,224 @@ def sync_binance_time():
 # 최초 실행 시 시간 동기화
 sync_binance_time()
 
+def _time_sync_loop():
+    while True:
+        time.sleep(TIME_SYNC_SEC)
+        sync_binance_time()
+
+threading.Thread(target=_time_sync_loop, name="time-sync", daemon=True).start()
+
 # 3. WebSocket Manager 시작
 twm = ThreadedWebsocketManager(api_key=api_key, api_secret=api_secret)
 twm.start()
 
-# 🔹 선물 레버리지 / 마진 조회 함수
+# 🔹 선물 레버리지 / 마진 캐시
+class SymbolConfigCache:
+    """
+    심볼별 (레버리지, 마진타입). 시작 시 REST 로 한 번 채우고 이후엔 user-data 소켓 이벤트로만 갱신.
+    - ACCOUNT_CONFIG_UPDATE : ac.s / ac.l  → 레버리지
+    - ACCOUNT_UPDATE        : a.P[].s / mt → 마진타입 (cross/isolated)
+    체결 처리 중엔 REST 를 부르지 않는다. 캐시에 없는 심볼만 1회 조회 후 저장.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}   # symbol → {"leverage": str, "margin_type": "CROSS"|"ISOLATED"}
+
+    def _set(self, symbol, leverage=None, margin_type=None):
+        symbol = symbol.upper()
+        with self._lock:
+            cur = self._data.setdefault(symbol, {"leverage": None, "margin_type": "CROSS"})
+            if leverage is not None:
+                cur["leverage"] = str(leverage)
+            if margin_type:
+                cur["margin_type"] = "ISOLATED" if str(margin_type).upper() == "ISOLATED" else "CROSS"
+
+    def seed(self):
+        """futures_account (전체 심볼 레버리지/격리 여부) + position_information (marginType)"""
+        try:
+            for pos in client.futures_account().get('positions', []):
+                self._set(pos['symbol'], pos.get('leverage'), "ISOLATED" if pos.get('isolated') else "CROSS")
+            for pos in client.futures_position_information():
+                self._set(pos['symbol'], pos.get('leverage'), pos.get('marginType'))
+            print(f"[✅ 레버리지/마진 캐시] {len(self._data)}개 심볼")
+        except Exception as e:
+            print(f"[ERROR] 레버리지/마진 캐시 초기화 실패: {e}")
+
+    def _fetch(self, symbol):
+        try:
+            for pos in client.futures_position_information(symbol=symbol.upper()):
+                if pos['symbol'] == symbol.upper():
+                    margin_type = pos.get('marginType') or ("ISOLATED" if float(pos.get('isolatedMargin', 0)) > 0 else "CROSS")
+                    self._set(symbol, pos.get('leverage'), margin_type)
+        except Exception as e:
+            print(f"[ERROR] 레버리지/마진 조회 실패: {e}")
+
+    def apply_event(self, msg):
+        e = msg.get('e')
+        if e == 'ACCOUNT_CONFIG_UPDATE':
+            ac = msg.get('ac') or {}
+            if ac.get('s'):
+                self._set(ac['s'], leverage=ac.get('l'))
+                print(f"[CONFIG] {ac['s']} 레버리지 → {ac.get('l')}")
+        elif e == 'ACCOUNT_UPDATE':
+            for p in (msg.get('a') or {}).get('P', []):
+                if p.get('s') and p.get('mt'):
+                    self._set(p['s'], margin_type=p['mt'])
+
+    def get(self, symbol):
+        with self._lock:
+            cur = self._data.get(symbol.upper())
+        if cur is None or cur["leverage"] is None:
+            self._fetch(symbol)
+            with self._lock:
+                cur = self._data.get(symbol.upper())
+        if cur is None:
+            return None, None
+        return cur["leverage"], cur["margin_type"]
+
+symbol_config = SymbolConfigCache()
+symbol_config.seed()
+
 def get_futures_position_info(symbol):
-    try:
-        sync_binance_time()
+    return symbol_config.get(symbol)
 
-        # 1️⃣ 레버리지 조회 (futures_account)
-        account_info = client.futures_account()
-        leverage = None
-        for pos in account_info['positions']:
-            if pos['symbol'] == symbol.upper():
-                leverage = pos['leverage']
 
-        # 2️⃣ 마진 타입 조회 (isolatedMargin 값 확인)
-        positions = client.futures_position_information(symbol=symbol.upper())
-        margin_type = "CROSS"
-        for pos in positions:
-            if pos['symbol'] == symbol.upper():
-                if float(pos.get('isolatedMargin', 0)) > 0:
-                    margin_type = "ISOLATED"
+# 🔹 복사 디스패처
+COPY_WORKERS = int(os.getenv("COPY_WORKERS", "8"))        # 동시에 복사 중인 (팔로워, 심볼) 레인 수 상한
+COPY_STATS_SEC = int(os.getenv("COPY_STATS_SEC", "60"))   # 큐/지연 통계 출력 주기(초)
 
-        return leverage, margin_type
+class CopyDispatcher:
+    """
+    handle_msg(소켓 스레드)는 정규화한 체결을 submit 만 하고 바로 다음 이벤트로 넘어간다.
+    (팔로워, 심볼) 레인마다 들어온 순서대로 실행 → 같은 심볼의 진입/청산이 뒤집히지 않고,
+    레인끼리는 COPY_WORKERS 스레드에서 병렬 → 느린 팔로워가 다른 팔로워/심볼을 막지 않는다.
+    """
+    def __init__(self, workers=COPY_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="copy")
+        self._lock = threading.Lock()
+        self._lanes = {}     # (api_key, symbol) → deque[(job, 넣은 시각)]. 키가 있으면 실행 중
+        self.depth = 0       # 대기 + 실행 중 작업 수
+        self.done = 0
+        self.wait_ms = Histogram()   # 큐 대기
+        self.exec_ms = Histogram()   # 팔로워 1명 복사 시간
+        self.fill_ms = Histogram()   # 체결 수신 → 마지막 팔로워 완료
 
-    except Exception as e:
-        print(f"[ERROR] 레버리지/마진 조회 실패: {e}")
-    return None, None
+    def submit(self, fill):
+        targets = list(fw.followers)
+        if not targets:
+            return
+        # 레버리지/마진은 체결당 한 번만 조회 (첫 레인이 조회, 나머지는 결과 재사용)
+        state = {"left": len(targets), "ok": 0, "config": None, "config_lock": threading.Lock()}
+        with self._lock:
+            self.depth += len(targets)
+        for f in targets:
+            self._enqueue((f["api_key"], fill["symbol"]), lambda f=f: self._copy(f, fill, state))
+
+    def _enqueue(self, key, job):
+        now = time.monotonic()
+        with self._lock:
+            q = self._lanes.get(key)
+            if q is not None:
+                q.append((job, now))
+                return
+            self._lanes[key] = collections.deque()
+        self.pool.submit(self._drain, key, job, now)
+
+    def _drain(self, key, job, queued_at):
+        while True:
+            t = time.monotonic()
+            try:
+                job()
+            except Exception as e:
+                print(f"[ERROR] 복사 작업 실패 {key[1]}: {e}")
+            with self._lock:
+                self.wait_ms.observe((t - queued_at) * 1000)
+                self.exec_ms.observe((time.monotonic() - t) * 1000)
+                self.depth -= 1
+                self.done += 1
+                q = self._lanes[key]
+                if not q:
+                    del self._lanes[key]
+                    return
+                job, queued_at = q.popleft()
+
+    @staticmethod
+    def _config(fill, state):
+        with state["config_lock"]:
+            if state["config"] is None:
+                leverage, margin_type = get_futures_position_info(fill["symbol"])
+                margin_text = "교차 마진 (Cross)" if margin_type == "CROSS" else "격리 마진 (Isolated)"
+                state["config"] = (leverage, margin_text)
+            return state["config"]
+
+    def _copy(self, follower, fill, state):
+        ok = False
+        leverage, margin_text = None, "-"
+        try:
+            leverage, margin_text = self._config(fill, state)
+            ok = copy_trade_to_follower(follower, fill["symbol"], fill["side"], fill["position_side"],
+                                        fill["qty"], fill["price"], leverage, margin_text)
+        finally:
+            # 실패해도 남은 수는 줄여야 체결 요약/fill_ms 가 빠지지 않는다
+            with self._lock:
+                state["left"] -= 1
+                state["ok"] += 1 if ok else 0
+                last = state["left"] == 0
+                if last:
+                    total = (time.monotonic() - fill["recv_ts"]) * 1000
+                    self.fill_ms.observe(total)
+            if last:
+                print(f"[COPY] {fill['symbol']} {fill['side']} {state['ok']}명 완료  {total:.0f}ms  "
+                      f"(레버리지 {leverage if leverage else '조회 실패'}배, {margin_text}, queue={self.depth})")
 
+    def stats(self):
+        with self._lock:
+            return {"queue": self.depth, "lanes": len(self._lanes), "done": self.done,
+                    "wait_ms": self.wait_ms.summary(), "exec_ms": self.exec_ms.summary(),
+                    "fill_ms": self.fill_ms.summary()}
 
-# 🔹 체결 이벤트 핸들러
+    def _stats_loop(self):
+        last = -1
+        while True:
+            time.sleep(COPY_STATS_SEC)
+            if self.done != last or self.depth:
+                last = self.done
+                print(f"[COPY STATS] {json.dumps(self.stats(), ensure_ascii=False)}")
+
+    def start(self):
+        threading.Thread(target=self._stats_loop, name="copy-stats", daemon=True).start()
+
+    def stop(self):
+        self.pool.shutdown(wait=False)
+
+dispatcher = CopyDispatcher()
+dispatcher.start()
+
+# 🔹 체결 이벤트 핸들러 (소켓 스레드: 정규화해서 큐에 넣기만)
 def handle_msg(msg):
-    if msg['e'] == 'ORDER_TRADE_UPDATE':
+    if msg.get('e') in ('ACCOUNT_CONFIG_UPDATE', 'ACCOUNT_UPDATE'):
+        symbol_config.apply_event(msg)
+        return
+    if msg.get('e') == 'ORDER_TRADE_UPDATE':
         order = msg['o']
         if order['x'] == 'TRADE' and order['X'] == 'FILLED':
-            symbol = order['s']
-            side = order['S']
-            qty = float(order['q'])
-            price = float(order['L'])
-            position_side = order.get('ps', 'BOTH')
-             
-            leverage, margin_type = get_futures_position_info(symbol)
-            print(leverage)
-            print(margin_type)
-            margin_text = "교차 마진 (Cross)" if margin_type == "CROSS" else "격리 마진 (Isolated)"
+            fill = {
+                "symbol": order['s'],
+                "side": order['S'],
+                "qty": float(order['q']),
+                "price": float(order['L']),
+                "position_side": order.get('ps', 'BOTH'),
+                "recv_ts": time.monotonic(),
+            }
+            dispatcher.submit(fill)
 
             print("\n[📈 선물 체결 감지]")
-            print(f"🔹 심볼       : {symbol}")
-            print(f"🔹 방향       : {side} | 포지션: {position_side}")
-            print(f"🔹 수량(Qty)  : {qty}")
-            print(f"🔹 체결가     : {price}")
-            print(f"🔹 레버리지   : {leverage if leverage else '조회 실패'}배")
-            print(f"🔹 마진 모드  : {margin_text if margin_type else '조회 실패'}")
-
-            copy_trade_to_followers(symbol,side,position_side,qty,price,leverage,margin_text)
-            
+            print(f"🔹 심볼       : {fill['symbol']}")
+            print(f"🔹 방향       : {fill['side']} | 포지션: {fill['position_side']}")
+            print(f"🔹 수량(Qty)  : {fill['qty']}")
+            print(f"🔹 체결가     : {fill['price']}")
+            print(f"🔹 복사 대기  : {dispatcher.depth}건")
+
 # 4. WebSocket 시작
 twm.start_futures_socket(callback=handle_msg)
 
@@ -97,4 +264,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n🛑 종료 요청 받음. WebSocket 정리 중...")
         twm.stop()
+        dispatcher.stop()
         print("✅ 정상 종료 완료.")
@@ -0,0 +1,305 @@
+# mock_exchange.py
+# 로컬 Blockfin 대역 (REST + private WS). 부하/지연/장애 테스트용 — 실제 주문은 나가지 않는다.
+#
+#   python mock_exchange.py            # 기본 127.0.0.1:8555
+#   BLOCKFIN_BASE_URL=http://127.0.0.1:8555 BLOCKFIN_WS_URL=ws://127.0.0.1:8555/ws/private python server.py
+#   (server.py 는 팔로워 서버에서 curl 을 실행하므로 servers.json 의 host 가 이 mock 에 닿을 수 있어야 한다)
+#
+# - ACCESS-SIGN 검증: base64(hex(hmac_sha256(secret, path+METHOD+ts+nonce+body))) — 키는 followers.json + .block.env/.env
+#   (또는 MOCK_ACCOUNTS=<json 파일> [{"key","secret","passphrase"}])
+# - POST /api/v1/trade/order, GET /api/v1/account/positions (계정별 메모리 포지션)
+# - /ws/private : login / subscribe(orders, positions). 주문이 체결되면 그 계정 구독자에게 orders 이벤트 push
+# - 장애 주입(환경변수 또는 POST /mock/config): 지연, 에러율, 키별 초당 요청 한도(429)
+# - POST /mock/fill : 마스터 체결 이벤트를 직접 push (마스터 수신 → 팔로워 fan-out 부하용)
+import os, sys, json, time, hmac, base64, random, asyncio, hashlib, itertools, collections
+from typing import Dict, List, Optional, Set, Tuple
+
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse
+from dotenv import dotenv_values
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PORT = int(os.environ.get("MOCK_PORT", "8555"))
+VERIFY = os.environ.get("MOCK_VERIFY", "1") == "1"                      # ACCESS-SIGN 검증 (0=아무 키나 통과)
+TS_WINDOW = float(os.environ.get("MOCK_TS_WINDOW", "30"))               # 타임스탬프 허용 오차(초)
+
+# 장애 주입 기본값 — 실행 중엔 POST /mock/config 로 변경
+CONFIG = {
+    "latency_ms": float(os.environ.get("MOCK_LATENCY_MS", "0")),        # REST 응답 지연
+    "jitter_ms": float(os.environ.get("MOCK_JITTER_MS", "0")),          # + uniform(0, jitter)
+    "error_rate": float(os.environ.get("MOCK_ERROR_RATE", "0")),        # 0~1, 해당 비율로 에러 응답
+    "error_status": int(os.environ.get("MOCK_ERROR_STATUS", "500")),    # 에러 응답 HTTP status (200 이면 code!=0 바디만)
+    "rate_limit": float(os.environ.get("MOCK_RATE_LIMIT", "0")),        # 키별 초당 요청 수 (0=무제한), 넘으면 429
+    "ws_delay_ms": float(os.environ.get("MOCK_WS_DELAY_MS", "0")),      # 체결 → orders 이벤트 push 지연
+}
+
+# ---------- 계정 ----------
+def _load_accounts() -> Dict[str, Dict]:
+    """apiKey → {"secret","passphrase"}"""
+    out: Dict[str, Dict] = {}
+    path = os.environ.get("MOCK_ACCOUNTS", "")
+    items: List[Dict] = []
+    try:
+        if path:
+            with open(path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        else:
+            fp = os.path.join(ROOT, "followers.json")
+            if os.path.exists(fp):
+                with open(fp, "r", encoding="utf-8") as f:
+                    items = json.load(f)
+            # 마스터 키: server.py 는 .block.env, block.py 등은 .env 에 둔다
+            for name in (".block.env", ".env"):
+                env = dotenv_values(os.path.join(ROOT, name))
+                if env.get("MASTER_API_KEY_BLO"):
+                    items.append({"key": env.get("MASTER_API_KEY_BLO"), "secret": env.get("MASTER_API_SECRET_BLO") or "",
+                                  "passphrase": env.get("passphrase") or ""})
+    except Exception as e:
+        print(f"[MOCK] 계정 로드 실패: {e}")
+    for it in items:
+        if it.get("key"):
+            out[it["key"]] = {"secret": it.get("secret") or "", "passphrase": it.get("passphrase") or ""}
+    return out
+
+ACCOUNTS = _load_accounts()
+
+def _sign(secret: str, prehash: str) -> str:
+    return base64.b64encode(hmac.new(secret.encode(), prehash.encode(), hashlib.sha256).hexdigest().encode()).decode()
+
+def _verify(key: str, passphrase: str, sign: str, ts: str, nonce: str, path: str, method: str, body: str = "") -> Optional[str]:
+    """성공 시 None, 실패 시 사유"""
+    if not VERIFY:
+        return None
+    acc = ACCOUNTS.get(key or "")
+    if acc is None:
+        return "unknown apiKey"
+    if passphrase != acc["passphrase"]:
+        return "passphrase mismatch"
+    try:
+        if abs(time.time() * 1000 - float(ts)) > TS_WINDOW * 1000:
+            return "timestamp expired"
+    except Exception:
+        return "bad timestamp"
+    if not hmac.compare_digest(sign or "", _sign(acc["secret"], f"{path}{method.upper()}{ts}{nonce}{body}")):
+        return "signature mismatch"
+    return None
+
+# ---------- 상태 ----------
+class RateLimiter:
+    """키별 토큰 버킷 (초당 rate, 버스트 = rate)"""
+    def __init__(self):
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+    def allow(self, key: str, rate: float) -> bool:
+        if rate <= 0:
+            return True
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (rate, now))
+        tokens = min(rate, tokens + (now - last) * rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+class Book:
+    """계정별 순포지션 (net). 주문은 즉시 전량 체결로 본다."""
+    def __init__(self):
+        self.pos: Dict[str, Dict[str, Dict]] = collections.defaultdict(dict)
+        self.order_ids = itertools.count(10_000_000)
+
+    def fill(self, key: str, inst_id: str, side: str, size: float, margin_mode: str, price: float) -> Tuple[Dict, bool]:
+        p = self.pos[key].get(inst_id) or {"positions": 0.0, "marginMode": margin_mode, "averagePrice": price}
+        before = p["positions"]
+        signed = size if side == "buy" else -size
+        reduce_only = before != 0 and (before > 0) != (signed > 0) and abs(signed) <= abs(before)
+        p["positions"] = before + signed
+        p["marginMode"] = margin_mode or p["marginMode"]
+        if not reduce_only:
+            p["averagePrice"] = price
+        if p["positions"] == 0:
+            self.pos[key].pop(inst_id, None)
+        else:
+            self.pos[key][inst_id] = p
+        return p, reduce_only
+
+    def positions(self, key: str, inst_id: Optional[str]) -> List[Dict]:
+        out = []
+        for iid, p in self.pos[key].items():
+            if inst_id and iid != inst_id:
+                continue
+            out.append({"instId": iid, "instType": "SWAP", "marginMode": p["marginMode"], "positionSide": "net",
+                        "positions": _num(p["positions"]), "averagePrice": _num(p["averagePrice"]), "leverage": "3"})
+        return out
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+book = Book()
+limiter = RateLimiter()
+stats = collections.Counter()
+subs: Dict[str, Dict[WebSocket, Set[str]]] = collections.defaultdict(dict)   # apiKey → ws → 구독 채널
+
+app = FastAPI(title="Blockfin mock", version="1.0")
+
+def _err(status: int, code: str, msg: str) -> JSONResponse:
+    return JSONResponse({"code": code, "msg": msg, "data": None}, status_code=status)
+
+async def _gate(request: Request, body: str) -> Tuple[Optional[str], Optional[JSONResponse]]:
+    """지연/레이트리밋/서명/에러 주입 공통 처리 → (apiKey, 에러응답)"""
+    h = request.headers
+    key = h.get("access-key", "")
+    stats["requests"] += 1
+    delay = CONFIG["latency_ms"] + random.uniform(0, CONFIG["jitter_ms"])
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+    if not limiter.allow(key, CONFIG["rate_limit"]):
+        stats["rate_limited"] += 1
+        return key, _err(429, "429", "Too Many Requests")
+    path = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    ts, nonce = h.get("access-timestamp", ""), h.get("access-nonce", "")
+    why = _verify(key, h.get("access-passphrase", ""), h.get("access-sign", ""), ts, nonce, path, request.method, body)
+    if why:
+        stats["auth_failed"] += 1
+        return key, _err(401, "401", f"authentication failed: {why}")
+    if CONFIG["error_rate"] > 0 and random.random() < CONFIG["error_rate"]:
+        stats["injected_errors"] += 1
+        return key, _err(CONFIG["error_status"], "500", "mock injected error")
+    return key, None
+
+# ---------- REST ----------
+@app.post("/api/v1/trade/order")
+async def trade_order(request: Request):
+    raw = (await request.body()).decode("utf-8", errors="replace")
+    key, err = await _gate(request, raw)
+    if err is not None:
+        return err
+    try:
+        body = json.loads(raw)
+        inst_id = body["instId"]
+        side = str(body["side"]).lower()
+        size = float(body["size"])
+    except Exception as e:
+        return _err(400, "400", f"bad order body: {e}")
+    if side not in ("buy", "sell") or size <= 0:
+        return _err(400, "400", "bad side/size")
+    price = float(body.get("price") or 0) or 100.0
+    pos, reduce_only = book.fill(key, inst_id, side, size, body.get("marginMode") or "cross", price)
+    if str(body.get("reduceOnly", "")).lower() == "true":
+        reduce_only = True
+    oid = str(next(book.order_ids))
+    stats["orders"] += 1
+    order = {"instId": inst_id, "instType": "SWAP", "orderId": oid, "clientOrderId": body.get("clientOrderId", ""),
+             "side": side, "positionSide": "net", "marginMode": body.get("marginMode") or "cross",
+             "orderType": (body.get("orderType") or "market").lower(), "price": body.get("price") or "",
+             "size": body["size"], "filledSize": body["size"], "averagePrice": _num(price),
+             "state": "filled", "reduceOnly": "true" if reduce_only else "false", "leverage": "3",
+             "updateTime": str(int(time.time() * 1000))}
+    asyncio.create_task(_push_fill(key, order, pos))
+    return {"code": "0", "msg": "", "data": [{"orderId": oid, "clientOrderId": order["clientOrderId"], "msg": "", "code": "0"}]}
+
+@app.get("/api/v1/account/positions")
+async def account_positions(request: Request, instId: Optional[str] = None):
+    key, err = await _gate(request, "")
+    if err is not None:
+        return err
+    return {"code": "0", "msg": "", "data": book.positions(key, instId)}
+
+# ---------- private WS ----------
+async def _send(key: Optional[str], channel: str, data: List[Dict]):
+    frame = json.dumps({"arg": {"channel": channel, "instType": "SWAP"}, "data": data})
+    targets = [(ws, ch) for k, m in subs.items() if key is None or k == key for ws, ch in list(m.items())]
+    for ws, ch in targets:
+        if channel in ch:
+            try:
+                await ws.send_text(frame)
+                stats[f"ws_{channel}"] += 1
+            except Exception:
+                pass
+
+async def _push_fill(key: str, order: Dict, pos: Dict):
+    if CONFIG["ws_delay_ms"] > 0:
+        await asyncio.sleep(CONFIG["ws_delay_ms"] / 1000)
+    await _send(key, "orders", [order])
+    await _send(key, "positions", book.positions(key, order["instId"]) or
+                [{"instId": order["instId"], "marginMode": order["marginMode"], "positionSide": "net", "positions": "0"}])
+
+@app.websocket("/ws/private")
+async def ws_private(ws: WebSocket):
+    await ws.accept()
+    key: Optional[str] = None
+    try:
+        while True:
+            text = await ws.receive_text()
+            if text == "ping":
+                await ws.send_text("pong"); continue
+            try:
+                msg = json.loads(text)
+            except Exception:
+                continue
+            op = msg.get("op")
+            arg = (msg.get("args") or [{}])[0]
+            if op == "login":
+                why = _verify(arg.get("apiKey", ""), arg.get("passphrase", ""), arg.get("sign", ""),
+                              str(arg.get("timestamp", "")), str(arg.get("nonce", "")), "/users/self/verify", "GET")
+                if why:
+                    await ws.send_text(json.dumps({"event": "error", "code": "401", "msg": f"login failed: {why}"}))
+                    continue
+                key = arg.get("apiKey", "")
+                subs[key][ws] = set()
+                await ws.send_text(json.dumps({"event": "login", "code": "0", "msg": ""}))
+            elif op == "subscribe":
+                if key is None:
+                    await ws.send_text(json.dumps({"event": "error", "code": "401", "msg": "not logged in"})); continue
+                subs[key][ws].add(arg.get("channel", ""))
+                await ws.send_text(json.dumps({"event": "subscribe", "arg": arg}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if key is not None:
+            subs[key].pop(ws, None)
+
+# ---------- 제어 ----------
+@app.post("/mock/config")
+async def mock_config(request: Request):
+    data = await request.json()
+    for k, v in data.items():
+        if k in CONFIG:
+            CONFIG[k] = type(CONFIG[k])(v)
+    return {"ok": True, "config": CONFIG}
+
+@app.post("/mock/fill")
+async def mock_fill(request: Request):
+    """{"instId","side","size","reduceOnly","count","interval_ms","key"} → orders 이벤트 push (key 없으면 전체 구독자)"""
+    data = await request.json()
+    count = int(data.get("count", 1))
+    interval = float(data.get("interval_ms", 0)) / 1000
+    for _ in range(count):
+        order = {"instId": data.get("instId", "BTC-USDT"), "instType": "SWAP", "orderId": str(next(book.order_ids)),
+                 "side": data.get("side", "buy"), "positionSide": "net", "marginMode": data.get("marginMode", "cross"),
+                 "orderType": data.get("orderType", "market"), "price": data.get("price", ""),
+                 "size": str(data.get("size", "1")), "filledSize": str(data.get("size", "1")), "state": "filled",
+                 "reduceOnly": "true" if str(data.get("reduceOnly", "false")).lower() == "true" else "false",
+                 "updateTime": str(int(time.time() * 1000))}
+        await _send(data.get("key"), "orders", [order])
+        if interval > 0:
+            await asyncio.sleep(interval)
+    return {"ok": True, "sent": count}
+
+@app.get("/mock/stats")
+async def mock_stats():
+    return {"ok": True, "config": CONFIG, "stats": dict(stats), "accounts": len(ACCOUNTS),
+            "ws_clients": sum(len(m) for m in subs.values()),
+            "positions": {k: book.positions(k, None) for k in list(book.pos.keys())}}
+
+@app.post("/mock/reset")
+async def mock_reset():
+    global ACCOUNTS
+    ACCOUNTS = _load_accounts()
+    book.pos.clear(); stats.clear(); limiter.buckets.clear()
+    return {"ok": True, "accounts": len(ACCOUNTS)}
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    print(f"[MOCK] Blockfin mock on http://127.0.0.1:{port}  accounts={len(ACCOUNTS)}  verify={VERIFY}  config={CONFIG}")
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
@@ -0,0 +1,177 @@
+# poller.py
+# 포지션 스냅샷 소스 + 적응형 폴링 스케줄.
+# - 변화 감지 직후(HOT_SEC 동안) / 설정한 거래 시간대(TRADING_HOURS)에는 FAST 간격
+# - 그 외엔 변화 없는 폴링마다 간격을 BACKOFF 배씩 늘려 SLOW 까지 (변화가 보이면 바로 FAST 로 복귀)
+# - RequestBudget : 레이트리밋 창(POLL_WINDOW_SEC)당 요청 수(POLL_BUDGET)를 넘지 않게 대기
+# - 감지 지연(거래소 updatedAt → 감지 시각)과 폴링 간격은 latency.Histogram 으로 집계
+# 소스는 next() → 스냅샷(list), mark(changed, lag_ms) 두 개만 있으면 된다.
+# 나중에 WS / long-poll 소스를 붙여도 diff 로직(bittuth.py)은 그대로.
+import os, time, json, collections
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from latency import Histogram
+
+POLL_FAST = float(os.getenv("POLL_FAST", os.getenv("POLL_INTERVAL", "0.25")))   # 활성 구간 간격(초). 예전 POLL_INTERVAL 도 인정
+POLL_SLOW = float(os.getenv("POLL_SLOW", "3.0"))             # 유휴 상한(초)
+POLL_BACKOFF = float(os.getenv("POLL_BACKOFF", "1.5"))       # 변화 없을 때 간격 증가 배수
+HOT_SEC = float(os.getenv("POLL_HOT_SEC", "30"))             # 변화 감지 후 FAST 유지 시간
+TRADING_HOURS = os.getenv("TRADING_HOURS", "")               # 예: "09:00-11:30,21:30-01:00" (로컬 시각)
+POLL_BUDGET = int(os.getenv("POLL_BUDGET", "300"))           # 창당 최대 요청 수 (0 이면 제한 없음)
+POLL_WINDOW_SEC = float(os.getenv("POLL_WINDOW_SEC", "60"))
+POLL_STATS_SEC = int(os.getenv("POLL_STATS_SEC", "60"))      # 통계 출력 주기(초)
+
+def parse_hours(spec: str) -> List[Tuple[int, int]]:
+    """"HH:MM-HH:MM,..." → [(시작분, 끝분)]. 자정을 넘는 구간(21:30-01:00)도 허용"""
+    out = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            a, b = part.split("-")
+            ah, am = a.strip().split(":"); bh, bm = b.strip().split(":")
+            out.append((int(ah) * 60 + int(am), int(bh) * 60 + int(bm)))
+        except ValueError:
+            print(f"[POLL] TRADING_HOURS 형식 오류 무시: {part!r}")
+    return out
+
+def in_hours(hours: List[Tuple[int, int]], t: Optional[float] = None) -> bool:
+    if not hours:
+        return False
+    lt = time.localtime(t)
+    m = lt.tm_hour * 60 + lt.tm_min
+    for start, end in hours:
+        if (start <= m < end) if start <= end else (m >= start or m < end):
+            return True
+    return False
+
+def parse_ts_ms(v) -> Optional[float]:
+    """거래소 시각(epoch 초/ms 숫자 또는 ISO 문자열) → epoch ms. 모르면 None"""
+    if v is None or v == "":
+        return None
+    try:
+        x = float(v)
+        return x if x > 1e11 else x * 1000
+    except (TypeError, ValueError):
+        pass
+    try:
+        s = str(v).replace("Z", "+00:00")
+        return datetime.fromisoformat(s).timestamp() * 1000
+    except ValueError:
+        return None
+
+class RequestBudget:
+    """최근 window 초 동안의 요청 시각(슬라이딩 창). limit 을 다 썼으면 가장 오래된 요청이 빠질 때까지 대기"""
+    def __init__(self, limit: int = POLL_BUDGET, window: float = POLL_WINDOW_SEC):
+        self.limit = limit
+        self.window = window
+        self._ts = collections.deque()
+        self.throttled = 0
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        if self.limit <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        while self._ts and now - self._ts[0] >= self.window:
+            self._ts.popleft()
+        if len(self._ts) < self.limit:
+            return 0.0
+        return self._ts[0] + self.window - now
+
+    def take(self, now: Optional[float] = None):
+        if self.limit > 0:
+            self._ts.append(time.monotonic() if now is None else now)
+
+    def used(self) -> int:
+        self.wait_time()
+        return len(self._ts)
+
+class AdaptiveSchedule:
+    def __init__(self, fast: float = POLL_FAST, slow: float = POLL_SLOW, backoff: float = POLL_BACKOFF,
+                 hot_sec: float = HOT_SEC, hours: str = TRADING_HOURS):
+        self.fast = fast
+        self.slow = max(fast, slow)
+        self.backoff = max(1.0, backoff)
+        self.hot_sec = hot_sec
+        self.hours = parse_hours(hours)
+        self.interval = fast
+        self.last_change = 0.0
+
+    def hot(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return (now - self.last_change) < self.hot_sec or in_hours(self.hours)
+
+    def mark(self, changed: bool, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        if changed:
+            self.last_change = now
+        if self.hot(now):
+            self.interval = self.fast
+        else:
+            self.interval = min(self.slow, self.interval * self.backoff)
+
+class RestPositionSource:
+    """
+    fetch() 를 적응형 간격 + 요청 예산 안에서 호출하는 폴링 소스.
+    next() 는 다음 폴링 시각까지 기다렸다가 스냅샷을 돌려준다 (fetch 예외는 그대로 올림).
+    """
+    def __init__(self, fetch: Callable[[], List[Dict]], schedule: Optional[AdaptiveSchedule] = None,
+                 budget: Optional[RequestBudget] = None):
+        self.fetch = fetch
+        self.schedule = schedule or AdaptiveSchedule()
+        self.budget = budget or RequestBudget()
+        self._last_poll: Optional[float] = None
+        self.requests = 0
+        self.changes = 0
+        self.lag_ms = Histogram()       # 거래소 updatedAt → 감지
+        self.gap_ms = Histogram()       # 폴링 간격 (updatedAt 이 없을 때 감지 지연 상한)
+        self._stats_at = time.monotonic()
+
+    def next(self) -> List[Dict]:
+        now = time.monotonic()
+        if self._last_poll is not None:
+            delay = self._last_poll + self.schedule.interval - now
+            if delay > 0:
+                time.sleep(delay)
+        wait = self.budget.wait_time()
+        if wait > 0:
+            self.budget.throttled += 1
+            time.sleep(wait)
+        now = time.monotonic()
+        if self._last_poll is not None:
+            self.gap_ms.observe((now - self._last_poll) * 1000)
+        self._last_poll = now
+        self.budget.take(now)
+        self.requests += 1
+        return self.fetch()
+
+    def mark(self, changed: bool, lag_ms: Optional[float] = None):
+        """diff 결과 통보. 변화가 있었으면 간격을 FAST 로, 없으면 백오프"""
+        if changed:
+            self.changes += 1
+            if lag_ms is not None and lag_ms >= 0:
+                self.lag_ms.observe(lag_ms)
+        self.schedule.mark(changed)
+        self._maybe_print_stats()
+
+    def stats(self) -> Dict:
+        return {
+            "interval": round(self.schedule.interval, 3),
+            "hot": self.schedule.hot(),
+            "requests": self.requests,
+            "changes": self.changes,
+            "budget_used": self.budget.used(),
+            "budget_limit": self.budget.limit,
+            "throttled": self.budget.throttled,
+            "detect_lag_ms": self.lag_ms.summary(),
+            "poll_gap_ms": self.gap_ms.summary(),
+        }
+
+    def _maybe_print_stats(self):
+        if POLL_STATS_SEC <= 0:
+            return
+        now = time.monotonic()
+        if now - self._stats_at >= POLL_STATS_SEC:
+            self._stats_at = now
+            print(f"[POLL STATS] {json.dumps(self.stats(), ensure_ascii=False)}", flush=True)
@@ -0,0 +1,67 @@
+# recorder.py
+# 마스터 orders 채널 원본 프레임 녹화 / 재생.
+# - 파일 포맷: 한 줄에 프레임 하나 `[recv_ms, "<원본 프레임 문자열>"]` (append-only JSON lines)
+# - 녹화는 별도 스레드가 파일에 쓰므로 WS 수신 루프는 큐에 넣기만 한다.
+# - 재생은 녹화 당시 간격을 speed 배로 줄여서(0 이하면 대기 없이 최대 속도) 프레임을 돌려준다.
+import os, json, time, queue, asyncio, threading
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+class FrameRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._q: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, name="recorder", daemon=True)
+        self._thread.start()
+
+    def write(self, recv_ms: float, raw):
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", errors="replace")
+        self._q.put(json.dumps([round(recv_ms, 3), raw], ensure_ascii=False, separators=(",", ":")))
+        self.count += 1
+
+    def _writer(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                line = self._q.get()
+                if line is None:
+                    break
+                f.write(line + "\n")
+                # 큐에 쌓인 게 없을 때만 flush (몰려올 땐 묶어서 쓴다)
+                if self._q.empty():
+                    f.flush()
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join(timeout=5)
+
+def read_frames(path: str) -> Iterator[Tuple[float, str]]:
+    """녹화 파일 → (recv_ms, raw). 깨진 줄(쓰다 죽은 마지막 줄 등)은 건너뛴다."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ts, raw = json.loads(line)
+                yield float(ts), raw
+            except Exception:
+                continue
+
+async def replay(path: str, speed: float = 1.0) -> AsyncIterator[Tuple[float, str]]:
+    """녹화 간격을 지켜 프레임을 돌려준다. speed=1 실시간, 10 = 10배속, 0 이하 = 대기 없음"""
+    first_ts: Optional[float] = None
+    start = time.monotonic()
+    for ts, raw in read_frames(path):
+        if first_ts is None:
+            first_ts = ts
+        if speed > 0:
+            delay = (ts - first_ts) / 1000 / speed - (time.monotonic() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            # 최대 속도라도 이벤트 루프(디스패처/로그)는 돌게 한다
+            await asyncio.sleep(0)
+        yield ts, raw
@@ -0,0 +1,114 @@
+# remote_agent.py
+# 팔로워 서버에서 SSH 세션 하나로 계속 떠 있는 실행 에이전트 (server.py FORWARD_MODE="ssh_agent").
+# 표준 라이브러리만 사용 → 원격에 python3 만 있으면 된다. master 가 소스를 `python3 -u -c` 로 넘겨 실행.
+#
+# 프로토콜 (JSON lines, stdin → stdout)
+#   요청: {"id": 7, "method": "POST", "path": "/api/v1/trade/order", "headers": {...}, "data": "<서명된 body 문자열>"}
+#   응답: {"id": 7, "status": 200, "text": "..."}   /  실패 시 {"id": 7, "status": 0, "error": "..."}
+#         보낸 뒤 응답을 못 받은 POST 는 재시도하지 않고 {"status": 0, "unknown": true} (중복 주문 방지)
+#   시작 시 {"id": 0, "ready": true} 한 줄을 먼저 보낸다.
+# 요청은 스레드 풀에서 동시에 처리되고, 응답 순서는 보장하지 않는다 (id 로 매칭).
+# 스레드마다 HTTPS keep-alive 연결을 하나씩 유지해 주문마다 TLS 핸드셰이크를 하지 않는다.
+import sys, json, threading, http.client, urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = sys.argv[1] if len(sys.argv) > 1 else "https://openapi.blockfin.com"
+WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+HTTP_TIMEOUT = 20
+
+_url = urllib.parse.urlsplit(BASE_URL)
+_prefix = _url.path.rstrip("/")
+_local = threading.local()
+_out_lock = threading.Lock()
+
+def _conn():
+    c = getattr(_local, "conn", None)
+    if c is None:
+        cls = http.client.HTTPSConnection if _url.scheme == "https" else http.client.HTTPConnection
+        c = cls(_url.netloc, timeout=HTTP_TIMEOUT)
+        _local.conn = c
+        _local.used = False
+    return c
+
+def _drop_conn():
+    c = getattr(_local, "conn", None)
+    if c is not None:
+        try: c.close()
+        except Exception: pass
+    _local.conn = None
+
+class OutcomeUnknown(Exception):
+    """요청은 나갔는데 응답을 못 받음 → 거래소가 처리했을 수 있으므로 재시도하지 않는다"""
+
+_STALE_SEND = (http.client.CannotSendRequest, BrokenPipeError, ConnectionResetError)
+_STALE_RECV = (http.client.RemoteDisconnected, ConnectionResetError)
+
+def _http(method: str, path: str, headers: dict, data: str):
+    payload = data.encode() if data else None
+    for attempt in (0, 1):
+        c = _conn()
+        reused = _local.used
+        # 1) 전송: 여기서 실패하면 요청이 서버에 닿지 않았으므로 재사용 연결이 닫힌 경우 1회 재시도
+        try:
+            c.request(method, _prefix + path, body=payload, headers=headers or {})
+        except _STALE_SEND:
+            _drop_conn()
+            if attempt or not reused:
+                raise
+            continue
+        except Exception:
+            _drop_conn()
+            raise
+        # 2) 응답: 본문까지 보낸 뒤라 POST 는 이미 접수됐을 수 있다 → GET 만 재시도
+        try:
+            r = c.getresponse()
+            text = r.read().decode(errors="ignore")
+        except _STALE_RECV as e:
+            _drop_conn()
+            if method == "GET" and reused and not attempt:
+                continue
+            if method != "GET":
+                raise OutcomeUnknown(f"{type(e).__name__}: {e}")
+            raise
+        except Exception:
+            _drop_conn()
+            raise
+        _local.used = True
+        if r.getheader("connection", "").lower() == "close":
+            _drop_conn()
+        return r.status, text
+
+def _emit(obj: dict):
+    line = json.dumps(obj, ensure_ascii=False) + "\n"
+    with _out_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+def _handle(req: dict):
+    rid = req.get("id")
+    try:
+        st, text = _http(str(req.get("method") or "GET").upper(), req.get("path") or "/",
+                         req.get("headers") or {}, req.get("data") or "")
+        _emit({"id": rid, "status": st, "text": text})
+    except OutcomeUnknown as e:
+        # status 0 → master 는 실패로 보고 포지션 캐시를 버린다 (실제 체결 여부는 거래소 기준)
+        _emit({"id": rid, "status": 0, "error": f"outcome-unknown: {e}", "unknown": True})
+    except Exception as e:
+        _emit({"id": rid, "status": 0, "error": f"{type(e).__name__}: {e}"})
+
+def main():
+    pool = ThreadPoolExecutor(max_workers=max(1, WORKERS))
+    _emit({"id": 0, "ready": True})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except Exception:
+            continue
+        pool.submit(_handle, req)
+    pool.shutdown(wait=True)
+
+if __name__ == "__main__":
+    main()
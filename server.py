@@ -1,18 +1,33 @@
 # server.py (v1.7 - SSH CURL only, no follower server needed)
-import os, sys, json, time, hmac, base64, hashlib, asyncio, websockets
-from typing import List, Dict, Tuple, Optional
-import uvicorn, requests, subprocess, shlex, shutil
-from dataclasses import dataclass
+import os, sys, json, time, hmac, math, base64, hashlib, asyncio, websockets, collections
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+import uvicorn, requests, subprocess, shlex, shutil, tempfile, threading, itertools, ipaddress, urllib.parse
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor, Future, wait, TimeoutError as FutureTimeout
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, UploadFile, File
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+from config_cache import JsonFileCache
+import latency, metrics, recorder
+from dedup import FillDedup
+import coalesce
 
 # ====== 운영 스위치 ======
 USE_DIRECT = False            # 마스터가 직접 주문(로컬에서 REST) => False 유지
-FORWARD_MODE = "ssh_curl"     # 원격에서 curl 호출 (팔로워 서버/터널 불필요)
+FORWARD_MODE = os.environ.get("FORWARD_MODE", "ssh_curl")  # "ssh_curl": 주문마다 원격 curl / "ssh_agent": 상주 에이전트
+FANOUT_MODE = os.environ.get("FANOUT_MODE", "concurrent")          # "concurrent" | "serial"
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", "16"))        # 동시 전송 팔로워 수 상한
+FOLLOWER_DEADLINE = float(os.environ.get("FOLLOWER_DEADLINE", "25"))  # 팔로워별 마감(초, 신호 시점 기준)
+FANOUT_BATCH = os.environ.get("FANOUT_BATCH", "1") == "1"          # 같은 서버 팔로워 요청을 원격 호출 1회로 묶기
+POSITION_TTL = float(os.environ.get("POSITION_TTL", "60"))           # 팔로워 포지션 캐시 유효시간(초), 지나면 REST 조회
+POSITION_REFRESH_SEC = float(os.environ.get("POSITION_REFRESH_SEC", "15"))  # 백그라운드 포지션 갱신 주기 (0=끔)
+POSITION_WS = os.environ.get("POSITION_WS", "0") == "1"            # 팔로워 private WS positions 채널로 캐시 갱신
+DISPATCH_MODE = os.environ.get("DISPATCH_MODE", "lanes")             # "lanes": 팔로워별 레인 병렬 / "fill": 체결 단위 순차(서버 배치)
+LANE_WORKERS = int(os.environ.get("LANE_WORKERS", "32"))             # 동시에 실행되는 레인 수 상한
+RECORD_PATH = os.environ.get("RECORD_PATH", "")                      # 지정 시 마스터 orders 원본 프레임을 이 파일에 녹화
 
 # ---------- Paths ----------
 def app_dir() -> str:
@@ -26,10 +41,20 @@ AUTH_PATH = os.path.join(ROOT, ".auth.env")
 FOLLOWERS_JSON = os.path.join(ROOT, "followers.json")   # [{id,name,key,secret,passphrase}]
 SERVERS_JSON = os.path.join(ROOT, "servers.json")       # [{"name","host","port","user","auth":{"type":"pem","keyPath":...},"python":"/usr/bin/python3"}]
 SSH_BIN = os.environ.get("SSH_BIN", "ssh")
+SSH_MUX = os.environ.get("SSH_MUX", "1") == "1" and os.name != "nt"   # ControlMaster 재사용 (Windows OpenSSH 미지원)
+SSH_CONTROL_DIR = os.environ.get("SSH_CONTROL_DIR", tempfile.gettempdir())
+SSH_CONTROL_PERSIST = os.environ.get("SSH_CONTROL_PERSIST", "600")   # 유휴 master 유지 시간(초)
+SSH_MAX_SESSIONS = int(os.environ.get("SSH_MAX_SESSIONS", "8"))   # 호스트당 동시 ssh 세션 (sshd MaxSessions 기본 10, 에이전트 세션 여유분 제외)
+SSH_CHECK_SEC = float(os.environ.get("SSH_CHECK_SEC", "30"))   # 소켓이 있어도 이 간격마다 -O check 로 master 생존 확인
+AGENT_SRC = os.path.join(ROOT, "remote_agent.py")                    # FORWARD_MODE=ssh_agent 에서 원격 실행
+AGENT_WORKERS = int(os.environ.get("AGENT_WORKERS", "8"))            # 에이전트 1개당 동시 HTTP 요청 수
 STATIC_DIR = os.path.join(ROOT, "static")
 os.makedirs(STATIC_DIR, exist_ok=True)
 
-BASE_URL = "https://openapi.blockfin.com"   # Blockfin REST base
+DEFAULT_BASE_URL = "https://openapi.blockfin.com"
+BASE_URL = os.environ.get("BLOCKFIN_BASE_URL", DEFAULT_BASE_URL)   # Blockfin REST base (mock_exchange.py 로 교체 가능)
+REPLAY_ALLOW_LIVE = os.environ.get("REPLAY_ALLOW_LIVE", "0") == "1"   # 실거래소로 재생 주문을 보내도 되는지
+REPLAY_MOCK_HOSTS = {h.strip().lower() for h in os.environ.get("REPLAY_MOCK_HOSTS", "").split(",") if h.strip()}   # 루프백 외에 mock 으로 인정할 호스트
 
 # ---------- ENV helpers ----------
 def ensure_env():
@@ -72,23 +97,20 @@ def save_env(master_key: str, master_secret: str, passphrase: str):
             f.write(f"{k}={v}\n")
 
 # ---------- Followers (followers.json) ----------
+def _parse_followers(arr) -> List[Dict]:
+    out=[]
+    for it in arr:
+        out.append({
+            "id": str(it.get("id") or ""),
+            "name": it.get("name",""),
+            "key": it.get("key",""),
+            "secret": it.get("secret",""),
+            "passphrase": it.get("passphrase",""),
+        })
+    return out
+
 def load_followers_config() -> List[Dict]:
-    if not os.path.exists(FOLLOWERS_JSON):
-        return []
-    try:
-        arr = json.load(open(FOLLOWERS_JSON, "r", encoding="utf-8"))
-        out=[]
-        for it in arr:
-            out.append({
-                "id": str(it.get("id") or ""),
-                "name": it.get("name",""),
-                "key": it.get("key",""),
-                "secret": it.get("secret",""),
-                "passphrase": it.get("passphrase",""),
-            })
-        return out
-    except Exception:
-        return []
+    return registry.followers.get()
 
 def save_followers_config(text: str):
     data = json.loads(text) if (text or "").strip() else []
@@ -99,6 +121,7 @@ def save_followers_config(text: str):
             raise ValueError("Each follower must be an object")
     with open(FOLLOWERS_JSON, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    registry.invalidate()
 
 # ---------- Servers (servers.json) ----------
 def ensure_servers_config():
@@ -106,12 +129,98 @@ def ensure_servers_config():
         with open(SERVERS_JSON, "w", encoding="utf-8") as f:
             f.write('{"servers": []}')
 
+def _parse_servers(cfg) -> Dict:
+    if not isinstance(cfg, dict) or not isinstance(cfg.get("servers", []), list):
+        raise ValueError("servers.json must be {\"servers\": [...]}")
+    return cfg
+
 def load_servers_config() -> Dict:
-    ensure_servers_config()
-    try:
-        return json.load(open(SERVERS_JSON, "r", encoding="utf-8"))
-    except Exception:
-        return {"servers": []}
+    return registry.servers.get()
+
+# ---------- Registry (followers ↔ servers) ----------
+class FollowerRegistry:
+    """
+    followers.json / servers.json 을 한 번 파싱해 두고 (팔로워, 서버) 짝을 미리 계산한다.
+    파일이 바뀌면(mtime) 또는 invalidate() 호출 시 다시 계산. 신호 처리 중엔 파일을 읽지 않는다.
+    """
+    def __init__(self):
+        self.followers = JsonFileCache(FOLLOWERS_JSON, _parse_followers, [],
+                                       on_error=lambda e: print(f"[WARN] followers.json 로드 실패: {e}"))
+        self.servers = JsonFileCache(SERVERS_JSON, _parse_servers, {"servers": []},
+                                     on_error=lambda e: print(f"[WARN] servers.json 로드 실패: {e}"))
+        self._ver: Optional[Tuple[int, int]] = None
+        self._pairs: List[Tuple[Dict, Dict]] = []
+        self._index: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _rebuild(self, followers: List[Dict], servers: List[Dict]):
+        index: Dict[str, Dict] = {}
+        for s in servers:
+            sname = str(s.get("name") or "").strip()
+            if sname and sname not in index:
+                index[sname] = s
+        pairs: List[Tuple[Dict, Dict]] = []
+        if followers and servers:
+            # name 또는 id 매칭 우선
+            for f in followers:
+                fid = (f.get("id") or "").strip()
+                fname = (f.get("name") or "").strip()
+                matched = (fid and index.get(fid)) or (fname and index.get(fname)) or None
+                if not matched and len(servers) == 1:
+                    matched = servers[0]
+                if matched:
+                    pairs.append((f, matched))
+        self._index, self._pairs = index, pairs
+
+    def _sync(self):
+        followers = self.followers.get()
+        servers = self.servers.get().get("servers", [])
+        ver = (self.followers.version, self.servers.version)
+        if ver != self._ver:
+            with self._lock:
+                if ver != self._ver:
+                    self._rebuild(followers, servers)
+                    self._ver = ver
+
+    def pairs(self) -> List[Tuple[Dict, Dict]]:
+        self._sync()
+        return self._pairs
+
+    def server_for(self, name_or_id: str) -> Optional[Dict]:
+        self._sync()
+        return self._index.get(str(name_or_id).strip())
+
+    def invalidate(self):
+        self.followers.invalidate()
+        self.servers.invalidate()
+
+registry = FollowerRegistry()
+
+# ---------- Metrics (/metrics, Prometheus text) ----------
+prom = metrics.Registry()
+M_FILLS = prom.counter("bf_fills_received_total", "FILLED master orders received", ["kind"])
+M_ORDERS = prom.counter("bf_orders_forwarded_total", "Follower orders forwarded", ["follower", "status"])
+M_SSH_FAIL = prom.counter("bf_ssh_exec_failures_total", "ssh executions that returned non-zero", ["server"])
+M_LOOKUP_FAIL = prom.counter("bf_close_lookup_failed_total", "Close position lookups that failed (position-lookup-failed)", ["follower"])
+M_COALESCED = prom.counter("bf_fills_coalesced_total", "Master fills merged into an earlier fill within COALESCE_MS")
+M_DEDUP = prom.counter("bf_fills_deduped_total", "Duplicate FILLED frames dropped (same orderId/state/fill)")
+M_WS_RECONNECT = prom.counter("bf_ws_reconnects_total", "Master WS reconnects in master_loop")
+M_ACK = prom.histogram("bf_follower_ack_seconds", "Master WS receive to follower response", ["kind"])
+M_LOOP_LAG = prom.histogram("bf_event_loop_lag_seconds", "asyncio event loop scheduling lag")
+M_BCAST_DROP = prom.counter("bf_broadcaster_dropped_total", "Log events dropped under backpressure", ["where"])
+M_BCAST_KICK = prom.counter("bf_broadcaster_slow_disconnects_total", "Dashboard clients disconnected for being slow", ["reason"])
+prom.gauge("bf_broadcaster_queue_depth", "Pending log events in Broadcaster", fn=lambda: broad.queue.qsize())
+prom.gauge("bf_broadcaster_clients", "Connected dashboard WS clients", fn=lambda: len(broad.clients))
+prom.gauge("bf_dispatch_queue_depth", "Fills waiting in FillDispatcher", fn=lambda: dispatcher.queue.qsize())
+prom.gauge("bf_dispatch_lanes", "Follower lanes with pending work", fn=lambda: len(dispatcher.lanes.lanes))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")   # 설정 시 Authorization: Bearer <token> 필요
+LOOP_LAG_INTERVAL = 0.5
+
+async def loop_lag_monitor():
+    while True:
+        t = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        M_LOOP_LAG.observe(max(0.0, time.perf_counter() - t - LOOP_LAG_INTERVAL))
 
 @dataclass
 class SshServer:
@@ -132,7 +241,8 @@ def _sq(s: str) -> str:
     """단일 인자로 bash -lc 에 안전하게 넘기기 위한 single-quote escape"""
     return "'" + s.replace("'", "'\"'\"'") + "'"
 
-def _ssh_exec(server: Dict, remote_cmd: str, timeout: int = 25) -> Tuple[int, str, str]:
+def _ssh_base(server: Dict) -> Tuple[List[str], str, Optional[str]]:
+    """ssh 공통 옵션 + 목적지. (cmd, dest, key_path)"""
     host = server["host"]
     user = server.get("user", "ubuntu")
     port = int(server.get("port") or 22)
@@ -149,39 +259,409 @@ def _ssh_exec(server: Dict, remote_cmd: str, timeout: int = 25) -> Tuple[int, st
         if os.name == "nt":
             _fix_key_perms_windows(key_path)
         cmd += ["-i", key_path]
+    return cmd, f"{user}@{host}", key_path
+
+# ---------- SSH connection pool (ControlMaster) ----------
+class SshPool:
+    """
+    (host, port, user, keyPath) 별로 ControlMaster 연결을 하나씩 띄워두고
+    이후 ssh 호출은 그 소켓을 재사용한다 (TCP/키교환/인증 생략).
+    master 는 -f 로 백그라운드 분리하며 stdout/stderr 를 물지 않게 DEVNULL 로 띄운다.
+    소켓이 죽어 있으면 ssh 는 ControlMaster=no 상태에서 직접 접속으로 넘어가므로
+    호출 자체는 실패하지 않고, 다음 호출 전에 master 가 다시 올라온다.
+    """
+    def __init__(self):
+        self._locks: Dict[tuple, threading.Lock] = {}
+        self._slots: Dict[tuple, threading.BoundedSemaphore] = {}
+        self._checked: Dict[tuple, float] = {}   # 마지막으로 master 생존을 확인한 시각
+        self._guard = threading.Lock()
+
+    @staticmethod
+    def key(server: Dict) -> tuple:
+        auth = server.get("auth", {})
+        return (server["host"], int(server.get("port") or 22), server.get("user", "ubuntu"), auth.get("keyPath") or "")
+
+    def control_path(self, server: Dict) -> str:
+        # unix 소켓 경로 길이 제한(~104자) 때문에 해시로 짧게
+        h = hashlib.sha1(repr(self.key(server)).encode()).hexdigest()[:16]
+        return os.path.join(SSH_CONTROL_DIR, f"bf-mux-{h}")
+
+    def _lock(self, server: Dict) -> threading.Lock:
+        k = self.key(server)
+        with self._guard:
+            if k not in self._locks:
+                self._locks[k] = threading.Lock()
+            return self._locks[k]
+
+    def slot(self, server: Dict) -> threading.BoundedSemaphore:
+        """호스트별 동시 세션 상한 (sshd MaxSessions 초과분은 mux 세션 요청이 거절된다)"""
+        k = self.key(server)
+        with self._guard:
+            if k not in self._slots:
+                self._slots[k] = threading.BoundedSemaphore(max(1, SSH_MAX_SESSIONS))
+            return self._slots[k]
+
+    def mux_opts(self, server: Dict, direct: bool = False) -> List[str]:
+        if not SSH_MUX:
+            return []
+        if direct:
+            # master 를 거치지 않는 단독 접속 (세션 거절 시 우회용)
+            return ["-o", "ControlMaster=no", "-o", "ControlPath=none"]
+        return ["-o", "ControlMaster=no", "-o", f"ControlPath={self.control_path(server)}"]
+
+    def alive(self, server: Dict) -> bool:
+        """ssh -O check 로 master 가 살아 있는지"""
+        if not SSH_MUX:
+            return False
+        base, dest, _ = _ssh_base(server)
+        try:
+            p = subprocess.run(base + ["-o", f"ControlPath={self.control_path(server)}", "-O", "check", dest],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, timeout=5)
+            return p.returncode == 0
+        except Exception:
+            return False
+
+    def ensure(self, server: Dict, timeout: float = 15) -> bool:
+        """
+        master 가 없으면 띄운다. 소켓이 있으면 SSH_CHECK_SEC 간격으로만 -O check 하고 그 사이엔 바로 반환.
+        소켓 파일만 남고 master 가 죽은 경우(원격 재부팅, 프로세스 kill)는 확인 실패 시 소켓을 지우고 다시 띄운다.
+        """
+        if not SSH_MUX:
+            return False
+        cp = self.control_path(server)
+        k = self.key(server)
+        if os.path.exists(cp) and time.monotonic() - self._checked.get(k, 0.0) < SSH_CHECK_SEC:
+            return True
+        with self._lock(server):
+            if os.path.exists(cp):
+                if time.monotonic() - self._checked.get(k, 0.0) < SSH_CHECK_SEC or self.alive(server):
+                    self._checked[k] = time.monotonic()
+                    return True
+                print(f"[SSH POOL] stale control socket → 재접속: {server.get('name') or server['host']}")
+                try:
+                    os.remove(cp)
+                except OSError:
+                    pass
+            base, dest, _ = _ssh_base(server)
+            cmd = base + ["-M", "-N", "-f",
+                          "-o", "ControlMaster=yes",
+                          "-o", f"ControlPath={cp}",
+                          "-o", f"ControlPersist={SSH_CONTROL_PERSIST}",
+                          dest]
+            try:
+                p = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, timeout=timeout)
+                ok = p.returncode == 0 and os.path.exists(cp)
+            except Exception as e:
+                print(f"[SSH POOL] connect error {dest}: {e}")
+                ok = False
+            if ok:
+                self._checked[k] = time.monotonic()
+            print(f"[SSH POOL] master {'up' if ok else 'FAILED'}: {dest}")
+            return ok
 
-    dest = f"{user}@{host}"
-    cmd += [dest, "bash", "-lc", _sq(remote_cmd)]
+    def reset_if_dead(self, server: Dict) -> bool:
+        """master 가 실제로 죽었을 때만 정리 (살아 있으면 같은 master 를 쓰는 다른 세션까지 끊지 않는다)"""
+        if not SSH_MUX or self.alive(server):
+            return False
+        self.reset(server)
+        return True
+
+    def reset(self, server: Dict):
+        """master 종료 + 소켓 정리. 다음 ensure() 에서 재접속된다."""
+        if not SSH_MUX:
+            return
+        cp = self.control_path(server)
+        base, dest, _ = _ssh_base(server)
+        with self._lock(server):
+            self._checked.pop(self.key(server), None)
+            try:
+                subprocess.run(base + ["-o", f"ControlPath={cp}", "-O", "exit", dest],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, timeout=5)
+            except Exception:
+                pass
+            try:
+                os.remove(cp)
+            except OSError:
+                pass
+
+    def warmup(self, servers: List[Dict]):
+        """servers.json 의 모든 서버에 미리 master 연결을 띄운다 (startup 용)."""
+        for s in servers:
+            try:
+                self.ensure(s)
+            except Exception as e:
+                print(f"[SSH POOL] warmup error: {e}")
+
+    def close_all(self, servers: List[Dict]):
+        for s in servers:
+            self.reset(s)
+
+ssh_pool = SshPool()
+
+# 원격 스크립트가 이보다 길면 argv 대신 stdin 으로 넘긴다 (리눅스 인자 1개 상한 128KB → 서버당 팔로워 수십 명 배치에서 E2BIG)
+SSH_ARG_MAX = int(os.environ.get("SSH_ARG_MAX", "65536"))
+
+# mux 소켓 자체가 문제일 때만 재시도 (원격 명령 실행 전 단계 → 중복 주문 위험 없음)
+_MUX_ERR_MARKERS = ("mux_client", "Control socket", "ControlSocket", "control_client")
+
+def _ssh_exec(server: Dict, remote_cmd: str, timeout: int = 25, _retry: bool = True, _direct: bool = False) -> Tuple[int, str, str]:
+    if not _direct:
+        with latency.timed("ssh_connect"):
+            ssh_pool.ensure(server, timeout=min(15, timeout))
+    base, dest, key_path = _ssh_base(server)
+    mux = ssh_pool.mux_opts(server, direct=_direct)
+    if len(remote_cmd) > SSH_ARG_MAX:
+        cmd = base + mux + [dest, "bash", "-l", "-s"]
+        stdin = remote_cmd.encode()
+    else:
+        cmd = base + mux + [dest, "bash", "-lc", _sq(remote_cmd)]
+        stdin = None
 
     try:
-        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        with ssh_pool.slot(server), latency.timed("http"):
+            p = subprocess.run(cmd, input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
         out = p.stdout.decode(errors="ignore")
         err = p.stderr.decode(errors="ignore")
+        if p.returncode != 0:
+            M_SSH_FAIL.inc(server.get("name") or server["host"])
         safe_cmd = " ".join([c if c != key_path else "<PEM>" for c in cmd])
         print(f"[SSH] cmd: {safe_cmd}  rc={p.returncode}")
         if err.strip():
             print(f"[SSH] stderr: {err[:1200]}")
+        if p.returncode == 255 and not _direct:
+            # 연결 레벨 실패. master 는 -O check 로 죽은 게 확인될 때만 재생성
+            # (세션 거절 같은 세션 단위 실패로 master 를 내리면 진행 중인 다른 주문까지 끊긴다)
+            dead = ssh_pool.reset_if_dead(server)
+            if _retry and any(m in err for m in _MUX_ERR_MARKERS):
+                # master 가 살아 있으면 세션 거절 → 이번 한 번은 단독 접속으로 우회
+                return _ssh_exec(server, remote_cmd, timeout=timeout, _retry=False, _direct=not dead)
         return p.returncode, out, err
     except Exception as e:
         print(f"[SSH] exec error: {e}")
+        M_SSH_FAIL.inc(server.get("name") or server["host"])
         return 255, "", str(e)
 
+# ---------- Remote agent (FORWARD_MODE=ssh_agent) ----------
+class AgentUnavailable(Exception):
+    """요청이 원격으로 나가기 전에 실패 → curl 경로로 넘겨도 안전"""
+
+class RemoteAgent:
+    """
+    서버 하나당 ssh 세션 하나로 remote_agent.py 를 상주시키고 JSON lines 로 요청을 주고받는다.
+    요청마다 id 를 붙여 보내고, 읽기 스레드가 응답 id 로 대기 중인 Future 를 깨운다 (다중화).
+    """
+    def __init__(self, server: Dict):
+        self.server = server
+        self.proc: Optional[subprocess.Popen] = None
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._retry_at = 0.0
+        self._seq = itertools.count(1)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self, timeout: float = 15) -> bool:
+        try:
+            with open(AGENT_SRC, "r", encoding="utf-8") as f:
+                src = f.read()
+        except Exception as e:
+            print(f"[AGENT] remote_agent.py 읽기 실패: {e}")
+            return False
+        py = self.server.get("python") or "python3"
+        remote = f"{shlex.quote(py)} -u -c {shlex.quote(src)} {shlex.quote(BASE_URL)} {AGENT_WORKERS}"
+        ssh_pool.ensure(self.server)
+        base, dest, _ = _ssh_base(self.server)
+        cmd = base + ssh_pool.mux_opts(self.server) + [dest, "bash", "-lc", _sq(remote)]
+        ready: Future = Future()
+        self._pending = {0: ready}
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL, bufsize=0)
+        except Exception as e:
+            print(f"[AGENT] spawn error {dest}: {e}")
+            return False
+        threading.Thread(target=self._reader, args=(self.proc,), daemon=True, name=f"agent-{dest}").start()
+        try:
+            ready.result(timeout=timeout)
+            print(f"[AGENT] ready: {dest}")
+            return True
+        except Exception as e:
+            print(f"[AGENT] start failed {dest}: {e}")
+            self.stop()
+            return False
+
+    def _reader(self, proc: subprocess.Popen):
+        for line in proc.stdout:
+            try:
+                msg = json.loads(line)
+            except Exception:
+                continue
+            with self._lock:
+                fut = self._pending.pop(msg.get("id"), None)
+            if fut and not fut.done():
+                fut.set_result(msg)
+        # EOF → 대기 중인 요청 전부 실패 처리
+        with self._lock:
+            pending = list(self._pending.values()); self._pending.clear()
+        for fut in pending:
+            if not fut.done():
+                fut.set_exception(ConnectionError("agent-eof"))
+
+    def submit(self, method: str, path: str, headers: Dict[str, str], data: str) -> Future:
+        """요청을 보내고 바로 Future 반환 (응답은 읽기 스레드가 채움)"""
+        rid = next(self._seq)
+        fut: Future = Future()
+        line = json.dumps({"id": rid, "method": method.upper(), "path": path, "headers": headers, "data": data},
+                          ensure_ascii=False) + "\n"
+        with self._lock:
+            if not self.alive():
+                raise AgentUnavailable("agent-not-running")
+            self._pending[rid] = fut
+            try:
+                self.proc.stdin.write(line.encode())
+                self.proc.stdin.flush()
+            except Exception as e:
+                self._pending.pop(rid, None)
+                raise AgentUnavailable(f"agent-write-failed: {e}")
+        return fut
+
+    @staticmethod
+    def _unpack(msg: Dict) -> Tuple[int, str]:
+        if msg.get("error"):
+            return 0, f"agent-error: {msg['error']}"
+        return int(msg.get("status") or 0), msg.get("text") or ""
+
+    def request(self, method: str, path: str, headers: Dict[str, str], data: str, timeout: float) -> Tuple[int, str]:
+        fut = self.submit(method, path, headers, data)
+        return self._unpack(fut.result(timeout=timeout))
+
+    def stop(self):
+        p = self.proc
+        self.proc = None
+        if p is not None:
+            try:
+                p.stdin.close()
+            except Exception:
+                pass
+            try:
+                p.terminate()
+            except Exception:
+                pass
+
+_agents: Dict[tuple, RemoteAgent] = {}
+_agents_lock = threading.Lock()
+
+AGENT_RETRY_SEC = 10   # 기동 실패 후 재시도 간격 (그 사이엔 curl 경로 사용)
+
+def _agent_for(server: Dict) -> Optional[RemoteAgent]:
+    k = SshPool.key(server)
+    with _agents_lock:
+        agent = _agents.get(k)
+        if agent is None:
+            agent = _agents[k] = RemoteAgent(server)
+    if agent.alive():
+        return agent
+    with agent._start_lock:
+        if agent.alive():
+            return agent
+        if time.monotonic() < agent._retry_at:
+            return None
+        if not agent.start():
+            agent._retry_at = time.monotonic() + AGENT_RETRY_SEC
+            return None
+        return agent
+
+def _agent_curl(server: Dict, method: str, path: str, headers: Dict[str,str], data_raw: str, timeout: float) -> Optional[Tuple[int, str]]:
+    """None 이면 에이전트 사용 불가(요청 미전송) → 호출측이 curl 로 대체"""
+    with latency.timed("ssh_connect"):
+        agent = _agent_for(server)
+    if agent is None:
+        return None
+    try:
+        with latency.timed("http"):
+            st, text = agent.request(method, path, headers, data_raw, timeout=timeout)
+    except AgentUnavailable as e:
+        print(f"[AGENT] {e} → curl fallback")
+        return None
+    except FutureTimeout:
+        return 0, "agent-timeout"
+    except Exception as e:
+        agent.stop()
+        return 0, f"agent-failed: {e}"
+    print(f"[SSH AGENT] {method} {path}  status={st}  len={len(text.strip())}")
+    return st, text
+
+def _agent_batch(server: Dict, reqs: List[Dict], timeout: float) -> Optional[List[Tuple[int, str]]]:
+    """여러 요청을 한 번에 에이전트로 밀어넣고 모아서 받는다. None 이면 하나도 안 나감 → curl 대체"""
+    with latency.timed("ssh_connect"):
+        agent = _agent_for(server)
+    if agent is None:
+        return None
+    t_http = time.perf_counter()
+    futs: List[Optional[Future]] = []
+    for r in reqs:
+        try:
+            futs.append(agent.submit(r["method"], r["path"], r["headers"], _body_str(r.get("body"))))
+        except AgentUnavailable as e:
+            if not futs:
+                print(f"[AGENT] {e} → curl fallback")
+                return None
+            futs.append(None)
+    wait([f for f in futs if f is not None], timeout=timeout)
+    latency.record("http", (time.perf_counter() - t_http) * 1000)
+    out: List[Tuple[int, str]] = []
+    for r, fut in zip(reqs, futs):
+        if fut is None:
+            out.append((0, "agent-failed: write"))
+        elif not fut.done():
+            out.append((0, "agent-timeout"))
+        elif fut.exception() is not None:
+            out.append((0, f"agent-failed: {fut.exception()}"))
+        else:
+            st, text = RemoteAgent._unpack(fut.result())
+            print(f"[SSH AGENT] {r['method']} {r['path']}  status={st}  len={len(text.strip())}")
+            out.append((st, text))
+    return out
+
+def start_agents(servers: List[Dict]):
+    for s in servers:
+        try:
+            _agent_for(s)
+        except Exception as e:
+            print(f"[AGENT] warmup error: {e}")
+
+def stop_agents():
+    with _agents_lock:
+        for agent in _agents.values():
+            agent.stop()
+        _agents.clear()
+
 # ---------- HMAC (Blockfin spec: base64(hexdigest)) ----------
 def _bf_sign(secret_key: str, method: str, path: str, body: Optional[dict]) -> Tuple[str, str, str]:
+    t_sign = time.perf_counter()
     ts = str(int(time.time() * 1000))
     nonce = ts
     body_str = json.dumps(body, separators=(",", ":"), ensure_ascii=False) if body else ""
     prehash = f"{path}{method.upper()}{ts}{nonce}{body_str}"
     hex_sig = hmac.new(secret_key.encode(), prehash.encode(), hashlib.sha256).hexdigest()
     sign = base64.b64encode(hex_sig.encode()).decode()
+    latency.record("sign", (time.perf_counter() - t_sign) * 1000)
     return sign, ts, nonce
 
 # ---------- Remote curl helpers ----------
-def _ssh_curl(server: Dict, method: str, path: str, headers: Dict[str,str], body: Optional[dict], timeout: int = 25) -> Tuple[int, str]:
+def _body_str(body: Optional[dict]) -> str:
+    # 서명(_bf_sign)과 동일한 직렬화여야 한다
+    return json.dumps(body, separators=(",", ":"), ensure_ascii=False) if body else ""
+
+def _curl_cmd(method: str, path: str, headers: Dict[str,str], body: Optional[dict]) -> str:
     url = f"{BASE_URL}{path}"
     # body
-    data_raw = json.dumps(body, separators=(",", ":"), ensure_ascii=False) if body else ""
-    data_escaped = shlex.quote(data_raw)
+    data_escaped = shlex.quote(_body_str(body))
     # headers
     hdrs = " ".join([f"-H {shlex.quote(k+': '+v)}" for k,v in headers.items()])
     # method & data flags
@@ -192,15 +672,14 @@ def _ssh_curl(server: Dict, method: str, path: str, headers: Dict[str,str], body
         data_part = f"-d @-"
         mflag = f"-X {method.upper()}"
 
-    cmd = (
+    return (
         (f"echo {data_escaped} | " if data_part else "") +
         f"curl -sS {mflag} -w ' HTTPSTATUS:%{{http_code}}' {hdrs} " +
         (data_part + " " if data_part else "") +
         shlex.quote(url)
     )
-    rc, out, err = _ssh_exec(server, cmd, timeout=timeout)
-    if rc != 0:
-        return 0, f"ssh-exec-failed: {err or out}"
+
+def _parse_curl(method: str, path: str, out: str) -> Tuple[int, str]:
     if "HTTPSTATUS:" in out:
         text, _, status = out.rpartition(" HTTPSTATUS:")
         try:
@@ -211,90 +690,257 @@ def _ssh_curl(server: Dict, method: str, path: str, headers: Dict[str,str], body
         return st, text
     return 0, out
 
+def _ssh_curl(server: Dict, method: str, path: str, headers: Dict[str,str], body: Optional[dict], timeout: int = 25) -> Tuple[int, str]:
+    if FORWARD_MODE == "ssh_agent":
+        res = _agent_curl(server, method, path, headers, _body_str(body), timeout)
+        if res is not None:
+            return res
+    cmd = _curl_cmd(method, path, headers, body)
+    rc, out, err = _ssh_exec(server, cmd, timeout=timeout)
+    if rc != 0:
+        return 0, f"ssh-exec-failed: {err or out}"
+    return _parse_curl(method, path, out)
+
+def _ssh_curl_batch(server: Dict, reqs: List[Dict], timeout: float = 25) -> List[Tuple[int, str]]:
+    """
+    같은 서버로 가는 요청 여러 개를 ssh 1회로 보낸다.
+    원격에서 curl 들을 백그라운드로 동시에 돌리고, 끝나면 구분자와 함께 순서대로 출력.
+    reqs: [{"method","path","headers","body"}]  →  [(status, text)] (reqs 순서)
+    """
+    if not reqs:
+        return []
+    if len(reqs) == 1:
+        r = reqs[0]
+        return [_ssh_curl(server, r["method"], r["path"], r["headers"], r.get("body"), timeout=timeout)]
+    if FORWARD_MODE == "ssh_agent":
+        res = _agent_batch(server, reqs, timeout)
+        if res is not None:
+            return res
+
+    mark = f"@@BF-{os.urandom(6).hex()}"
+    parts = ['d=$(mktemp -d)']
+    for i, r in enumerate(reqs):
+        parts.append(f'( {_curl_cmd(r["method"], r["path"], r["headers"], r.get("body"))} ) > "$d/{i}" 2>&1 &')
+    parts.append("wait")
+    parts.append(f'for i in $(seq 0 {len(reqs)-1}); do echo "{mark} $i"; cat "$d/$i"; echo; done')
+    parts.append('rm -rf "$d"')
+    rc, out, err = _ssh_exec(server, "\n".join(parts), timeout=timeout)
+    if rc != 0:
+        return [(0, f"ssh-exec-failed: {err or out}")] * len(reqs)
+
+    chunks: Dict[int, str] = {}
+    for block in out.split(mark + " ")[1:]:
+        idx, _, body = block.partition("\n")
+        try:
+            chunks[int(idx.strip())] = body[:-1] if body.endswith("\n") else body
+        except ValueError:
+            pass
+    return [_parse_curl(r["method"], r["path"], chunks[i]) if i in chunks else (0, "batch-missing-output")
+            for i, r in enumerate(reqs)]
+
 # ---------- Business: place/close through SSH curl ----------
 def _list_pairs_followers_servers() -> List[Tuple[Dict, Dict]]:
-    followers = load_followers_config()
-    servers = load_servers_config().get("servers", [])
-    pairs: List[Tuple[Dict, Dict]] = []
-    if not followers or not servers:
-        return pairs
-    # name 또는 id 매칭 우선
-    for f in followers:
-        fid = (f.get("id") or "").strip()
-        fname = (f.get("name") or "").strip()
-        matched = None
-        for s in servers:
-            sname = str(s.get("name") or "").strip()
-            if sname and (sname == fid or sname == fname):
-                matched = s; break
-        if not matched and len(servers) == 1:
-            matched = servers[0]
-        if matched:
-            pairs.append((f, matched))
-    return pairs
+    return registry.pairs()
 
-def ssh_place_order(inst_id: str, marginMode: str, side: str, orderType: str, price, size) -> List[Dict]:
-    results=[]
-    for f, srv in _list_pairs_followers_servers():
-        if not (f.get("key") and f.get("secret") and f.get("passphrase")):
-            results.append({"target": f.get("name") or f.get("id"), "error": "missing-keys"}); continue
-        body = {
-            "instId": inst_id,
-            "marginMode": marginMode,
-            "side": side.lower(),
-            "orderType": (orderType or "market").lower(),
-            "price": "" if (orderType or "market").lower()=="market" else (price or ""),
-            "size": str(size),
-        }
-        path = "/api/v1/trade/order"
-        sign, ts, nonce = _bf_sign(f["secret"], "POST", path, body)
-        headers = {
-            "ACCESS-KEY": f["key"],
-            "ACCESS-PASSPHRASE": f["passphrase"],
-            "ACCESS-SIGN": sign,
-            "ACCESS-TIMESTAMP": ts,
-            "ACCESS-NONCE": nonce,
-            "Content-Type": "application/json",
-        }
-        st, txt = _ssh_curl(srv, "POST", path, headers, body, timeout=25)
-        results.append({"target": f.get("name") or f.get("id"), "status": st, "text": txt})
-    return results
+def _target(f: Dict) -> str:
+    return f.get("name") or f.get("id")
 
-def ssh_close_position(inst_id: str, size) -> List[Dict]:
-    results=[]
-    for f, srv in _list_pairs_followers_servers():
-        if not (f.get("key") and f.get("secret") and f.get("passphrase")):
-            results.append({"target": f.get("name") or f.get("id"), "error": "missing-keys"}); continue
-        # 1) 포지션 조회 (원격 GET)
-        qpath = f"/api/v1/account/positions?instId={inst_id}"
-        sign_q, ts_q, nonce_q = _bf_sign(f["secret"], "GET", qpath, None)
-        headers_q = {
-            "ACCESS-KEY": f["key"],
-            "ACCESS-PASSPHRASE": f["passphrase"],
-            "ACCESS-SIGN": sign_q,
-            "ACCESS-TIMESTAMP": ts_q,
-            "ACCESS-NONCE": nonce_q,
-        }
-        st_q, txt_q = _ssh_curl(srv, "GET", qpath, headers_q, None, timeout=20)
-        margin_mode, close_side = None, None
+def _has_keys(f: Dict) -> bool:
+    return bool(f.get("key") and f.get("secret") and f.get("passphrase"))
+
+def _remaining(deadline_at: float) -> float:
+    """마감까지 남은 시간(초). 최소 0.5초는 보장해 ssh 가 즉시 죽지 않게 한다."""
+    return max(0.5, deadline_at - time.monotonic())
+
+def _signed_headers(f: Dict, method: str, path: str, body: Optional[dict]) -> Dict[str, str]:
+    sign, ts, nonce = _bf_sign(f["secret"], method, path, body)
+    headers = {
+        "ACCESS-KEY": f["key"],
+        "ACCESS-PASSPHRASE": f["passphrase"],
+        "ACCESS-SIGN": sign,
+        "ACCESS-TIMESTAMP": ts,
+        "ACCESS-NONCE": nonce,
+    }
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+    return headers
+
+def _signed_req(f: Dict, method: str, path: str, body: Optional[dict]) -> Dict:
+    return {"method": method, "path": path, "headers": _signed_headers(f, method, path, body), "body": body}
+
+def _parse_position(txt: str) -> Tuple[Optional[str], Optional[str]]:
+    """positions 응답 → (marginMode, 청산 side)"""
+    margin_mode, close_side = None, None
+    try:
+        jj = json.loads(txt)
+        if jj.get("code") == "0" and jj.get("data"):
+            pos = jj["data"][0]
+            margin_mode = pos.get("marginMode")
+            try:
+                size_now = float(pos.get("positions") or pos.get("position") or 0)
+            except Exception:
+                size_now = 0.0
+            close_side = "sell" if size_now > 0 else "buy"
+    except Exception:
+        pass
+    return margin_mode, close_side
+
+# ---------- Follower position cache ----------
+def _fkey(f: Dict) -> str:
+    return str(f.get("id") or f.get("name") or "")
+
+class PositionCache:
+    """
+    (팔로워, instId) → 마진모드/포지션 수량. 청산 신호 때 원격 GET 없이 side 를 정하기 위함.
+    갱신 경로: 백그라운드 REST 갱신, 팔로워 private WS(positions), 우리가 낸 시장가 주문의 성공 응답.
+    POSITION_TTL 이 지났거나 포지션이 0 이면 miss → 기존 REST 조회로 대체.
+    """
+    def __init__(self, ttl: float = POSITION_TTL):
+        self.ttl = ttl
+        self._data: Dict[Tuple[str, str], Dict] = {}
+        self._snap_ts: Dict[str, float] = {}    # 팔로워별 마지막 전체 스냅샷 시각
+        self._touched: Dict[Tuple[str, str], float] = {}   # 우리 주문으로 바꾸거나 버린 시각 (그 이전에 시작한 스냅샷은 무시)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _qty(pos: Dict) -> float:
         try:
-            jj = json.loads(txt_q)
-            if jj.get("code") == "0" and jj.get("data"):
-                pos = jj["data"][0]
-                margin_mode = pos.get("marginMode")
-                try:
-                    size_now = float(pos.get("positions") or pos.get("position") or 0)
-                except Exception:
-                    size_now = 0.0
-                close_side = "sell" if size_now > 0 else "buy"
+            return float(pos.get("positions") or pos.get("position") or 0)
         except Exception:
-            pass
+            return 0.0
+
+    def put(self, fid: str, inst_id: str, margin_mode: Optional[str], qty: float):
+        with self._lock:
+            self._data[(fid, inst_id)] = {"marginMode": margin_mode, "qty": qty, "ts": time.monotonic()}
+
+    def apply_positions(self, fid: str, rows: List[Dict], snapshot: bool = False, as_of: Optional[float] = None):
+        """
+        positions REST 응답/WS push 의 data 배열 반영. snapshot 이면 목록에 없는 종목은 0 으로 본다.
+        as_of = 조회를 시작한 시각(monotonic). 그 뒤에 우리 주문으로 바뀐 종목은 덮어쓰지 않는다.
+        """
+        now = time.monotonic()
+        def stale(k) -> bool:
+            return as_of is not None and self._touched.get(k, float("-inf")) >= as_of
+        with self._lock:
+            if snapshot:
+                self._snap_ts[fid] = now
+                for k, v in self._data.items():
+                    if k[0] == fid and not stale(k):
+                        v["qty"] = 0.0; v["ts"] = now
+            for pos in rows or []:
+                inst_id = pos.get("instId")
+                if not inst_id or stale((fid, inst_id)):
+                    continue
+                self._data[(fid, inst_id)] = {"marginMode": pos.get("marginMode"), "qty": self._qty(pos), "ts": now}
+
+    def apply_fill(self, fid: str, inst_id: str, margin_mode: Optional[str], side: str, size):
+        """우리 시장가 주문이 접수됐을 때 낙관적으로 반영 (net 모드 기준 buy=+, sell=-). 지정가는 호출하지 말 것"""
+        try:
+            delta = float(size) * (1 if side.lower() == "buy" else -1)
+        except Exception:
+            return
+        with self._lock:
+            self._touched[(fid, inst_id)] = time.monotonic()
+            cur = self._data.get((fid, inst_id))
+            if cur is None:
+                # 최근 전체 스냅샷에 없던 종목 = 포지션 0 에서 시작. 스냅샷도 없으면 추정하지 않는다.
+                if (time.monotonic() - self._snap_ts.get(fid, float("-inf"))) > self.ttl:
+                    return
+                cur = self._data[(fid, inst_id)] = {"marginMode": margin_mode, "qty": 0.0, "ts": time.monotonic()}
+            cur["qty"] += delta
+            if margin_mode:
+                cur["marginMode"] = margin_mode
 
+    def lookup(self, fid: str, inst_id: str) -> Tuple[Optional[str], Optional[str]]:
+        """(marginMode, 청산 side) — miss 면 (None, None)"""
+        with self._lock:
+            v = self._data.get((fid, inst_id))
+            if not v or (time.monotonic() - v["ts"]) > self.ttl:
+                return None, None
+            if not v["marginMode"] or abs(v["qty"]) <= 0:
+                return None, None
+            return v["marginMode"], ("sell" if v["qty"] > 0 else "buy")
+
+    def invalidate(self, fid: str, inst_id: str):
+        with self._lock:
+            self._touched[(fid, inst_id)] = time.monotonic()
+            self._data.pop((fid, inst_id), None)
+
+    def snapshot(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [{"follower": k[0], "instId": k[1], "marginMode": v["marginMode"], "qty": v["qty"],
+                     "age_s": round(now - v["ts"], 1)} for k, v in self._data.items()]
+
+positions = PositionCache()
+
+def _order_ok(st: int, txt: str) -> bool:
+    if st != 200:
+        return False
+    try:
+        return str(json.loads(txt).get("code")) == "0"
+    except Exception:
+        return False
+
+def _place_group(srv: Dict, fs: List[Dict], deadline_at: float, inst_id: str, marginMode: str, side: str, orderType: str, price, size) -> List[Dict]:
+    """같은 서버에 묶인 팔로워들의 진입 주문 (서버당 원격 호출 1회)"""
+    body = {
+        "instId": inst_id,
+        "marginMode": marginMode,
+        "side": side.lower(),
+        "orderType": (orderType or "market").lower(),
+        "price": "" if (orderType or "market").lower()=="market" else (price or ""),
+        "size": str(size),
+    }
+    path = "/api/v1/trade/order"
+    results: List[Optional[Dict]] = [None] * len(fs)
+    idx, reqs = [], []
+    for i, f in enumerate(fs):
+        if not _has_keys(f):
+            results[i] = {"target": _target(f), "error": "missing-keys"}; continue
+        idx.append(i); reqs.append(_signed_req(f, "POST", path, body))
+    is_market = body["orderType"] == "market"
+    for i, (st, txt) in zip(idx, _ssh_curl_batch(srv, reqs, timeout=min(25, _remaining(deadline_at)))):
+        results[i] = {"target": _target(fs[i]), "status": st, "text": txt}
+        if not _order_ok(st, txt):
+            # 실패/결과 불명(status 0, 타임아웃, ssh 실패)이면 실제로 나갔을 수 있으니 캐시를 버린다
+            positions.invalidate(_fkey(fs[i]), inst_id)
+            continue
+        if is_market:
+            positions.apply_fill(_fkey(fs[i]), inst_id, marginMode, side, size)
+        else:
+            # 지정가는 접수 ≠ 체결. 추정하지 않고 다음 청산은 REST/WS 로 확인
+            positions.invalidate(_fkey(fs[i]), inst_id)
+    return results
+
+def _close_group(srv: Dict, fs: List[Dict], deadline_at: float, inst_id: str, size) -> List[Dict]:
+    """같은 서버에 묶인 팔로워들의 청산 (조회 1회 + 주문 1회)"""
+    results: List[Optional[Dict]] = [None] * len(fs)
+    resolved: Dict[int, Tuple[str, str]] = {}
+    # 1) 포지션: 캐시 우선, miss 만 원격 GET
+    qpath = f"/api/v1/account/positions?instId={inst_id}"
+    idx, reqs = [], []
+    for i, f in enumerate(fs):
+        if not _has_keys(f):
+            results[i] = {"target": _target(f), "error": "missing-keys"}; continue
+        margin_mode, close_side = positions.lookup(_fkey(f), inst_id)
+        if margin_mode and close_side:
+            resolved[i] = (margin_mode, close_side); continue
+        idx.append(i); reqs.append(_signed_req(f, "GET", qpath, None))
+    lookups = _ssh_curl_batch(srv, reqs, timeout=min(20, _remaining(deadline_at)))
+    for i, (st_q, txt_q) in zip(idx, lookups):
+        margin_mode, close_side = _parse_position(txt_q)
         if not margin_mode or not close_side:
-            results.append({"target": f.get("name") or f.get("id"), "error":"position-lookup-failed", "status": st_q, "resp": txt_q[:300]})
+            results[i] = {"target": _target(fs[i]), "error":"position-lookup-failed", "status": st_q, "resp": txt_q[:300]}
+            M_LOOKUP_FAIL.inc(_target(fs[i]))
             continue
+        resolved[i] = (margin_mode, close_side)
 
-        # 2) 시장가 청산 주문
+    # 2) 시장가 청산 주문
+    path = "/api/v1/trade/order"
+    idx2, reqs2 = [], []
+    for i in sorted(resolved):
+        margin_mode, close_side = resolved[i]
         body = {
             "instId": inst_id,
             "marginMode": margin_mode,
@@ -303,45 +949,264 @@ def ssh_close_position(inst_id: str, size) -> List[Dict]:
             "price": "",
             "size": str(size),
         }
-        path = "/api/v1/trade/order"
-        sign, ts, nonce = _bf_sign(f["secret"], "POST", path, body)
-        headers = {
-            "ACCESS-KEY": f["key"],
-            "ACCESS-PASSPHRASE": f["passphrase"],
-            "ACCESS-SIGN": sign,
-            "ACCESS-TIMESTAMP": ts,
-            "ACCESS-NONCE": nonce,
-            "Content-Type": "application/json",
-        }
-        st, txt = _ssh_curl(srv, "POST", path, headers, body, timeout=25)
-        results.append({"target": f.get("name") or f.get("id"), "status": st, "text": txt})
+        idx2.append(i); reqs2.append(_signed_req(fs[i], "POST", path, body))
+    for i, (st, txt) in zip(idx2, _ssh_curl_batch(srv, reqs2, timeout=min(25, _remaining(deadline_at)))):
+        results[i] = {"target": _target(fs[i]), "status": st, "text": txt}
+        if _order_ok(st, txt):
+            positions.apply_fill(_fkey(fs[i]), inst_id, resolved[i][0], resolved[i][1], size)
+        else:
+            # 캐시가 틀렸을 수 있으니 다음 신호는 REST 로 확인
+            positions.invalidate(_fkey(fs[i]), inst_id)
     return results
 
+# ---------- Fan-out (팔로워 동시 전송) ----------
+_fanout_pool = ThreadPoolExecutor(max_workers=max(1, FANOUT_WORKERS), thread_name_prefix="fanout")
+
+def _group_by_server(pairs: List[Tuple[Dict, Dict]]) -> List[Tuple[Dict, List[Dict]]]:
+    """FANOUT_BATCH 면 같은 서버 팔로워끼리 묶고, 아니면 팔로워 1명 = 1그룹"""
+    if not FANOUT_BATCH:
+        return [(srv, [f]) for f, srv in pairs]
+    groups: Dict[tuple, Tuple[Dict, List[Dict]]] = {}
+    for f, srv in pairs:
+        groups.setdefault(SshPool.key(srv), (srv, []))[1].append(f)
+    return list(groups.values())
+
+def _invalidate_unknown(fn, fs: List[Dict], args: tuple):
+    """주문 결과를 모르는 팔로워(예외/마감 초과)는 포지션 캐시를 버린다 (args[0] = instId)"""
+    if fn in (_place_group, _close_group) and args:
+        for f in fs:
+            positions.invalidate(_fkey(f), args[0])
+
+def _timed(fn, srv: Dict, fs: List[Dict], t0: float, deadline_at: float, trace: Optional[latency.Trace], *args) -> List[Dict]:
+    sname = srv.get("name") or srv.get("host")
+    span = latency.Span(trace, [_target(f) for f in fs], server=sname)
+    t_start = time.monotonic()
+    with latency.bind(span):
+        try:
+            results = fn(srv, fs, deadline_at, *args)
+        except Exception as e:
+            results = [{"target": _target(f), "error": str(e)} for f in fs]
+            _invalidate_unknown(fn, fs, args)
+    t_end = time.monotonic()
+    span.record("queue", (t_start - t0) * 1000)
+    span.record("follower", (t_end - t_start) * 1000)
+    if trace is not None and "recv" in trace.stamps:
+        span.record("total", latency.now_ms() - trace.stamps["recv"])
+    if fn in (_place_group, _close_group):
+        kind = "close" if fn is _close_group else "open"
+        ack_s = (latency.now_ms() - trace.stamps["recv"]) / 1000 if trace is not None and "recv" in trace.stamps else t_end - t0
+        for res in results:
+            M_ORDERS.inc(res.get("target"), res.get("error") or res.get("status"))
+            if "status" in res and "error" not in res:
+                M_ACK.observe(ack_s, kind)
+    for res in results:
+        res["server"] = sname
+        res["queued_ms"] = round((t_start - t0) * 1000, 1)
+        res["elapsed_ms"] = round((t_end - t_start) * 1000, 1)
+        res["ack_ms"] = round((t_end - t0) * 1000, 1)
+        if trace is not None:
+            res["trace"] = trace.id
+    return results
+
+def _fanout(fn, *args) -> List[Dict]:
+    """
+    서버 그룹별 작업(fn)을 실행하고 결과를 팔로워 순서대로 돌려준다.
+    - FANOUT_MODE=concurrent : FANOUT_WORKERS 개 스레드로 그룹들을 동시에 실행
+    - FANOUT_MODE=serial     : 기존처럼 하나씩 순서대로 실행
+    - FANOUT_BATCH=1         : 같은 서버 팔로워는 원격 호출 1회로 묶음 (N명/M서버 → M회)
+    마감(FOLLOWER_DEADLINE)을 넘긴 팔로워는 error=deadline-exceeded 로 기록된다.
+    (이미 나간 원격 요청은 취소되지 않으므로 실제 주문 여부는 거래소에서 확인 필요)
+    """
+    pairs = _list_pairs_followers_servers()
+    groups = _group_by_server(pairs)
+    parent = latency.current()
+    trace = parent.trace if parent is not None else None
+    t0 = time.monotonic()
+    deadline_at = t0 + FOLLOWER_DEADLINE
+    by_id: Dict[int, Dict] = {}
+    if FANOUT_MODE != "concurrent" or len(groups) <= 1:
+        for srv, fs in groups:
+            for f, res in zip(fs, _timed(fn, srv, fs, t0, deadline_at, trace, *args)):
+                by_id[id(f)] = res
+    else:
+        futs = [_fanout_pool.submit(_timed, fn, srv, fs, t0, deadline_at, trace, *args) for srv, fs in groups]
+        wait(futs, timeout=FOLLOWER_DEADLINE)
+        for (srv, fs), fut in zip(groups, futs):
+            if fut.done():
+                for f, res in zip(fs, fut.result()):
+                    by_id[id(f)] = res
+                continue
+            fut.cancel()
+            _invalidate_unknown(fn, fs, args)
+            for f in fs:
+                by_id[id(f)] = {"target": _target(f), "error": "deadline-exceeded",
+                                "server": srv.get("name") or srv.get("host"),
+                                "ack_ms": round((time.monotonic() - t0) * 1000, 1)}
+    return [by_id[id(f)] for f, _ in pairs]
+
+def ssh_place_order(inst_id: str, marginMode: str, side: str, orderType: str, price, size) -> List[Dict]:
+    return _fanout(_place_group, inst_id, marginMode, side, orderType, price, size)
+
+def ssh_close_position(inst_id: str, size) -> List[Dict]:
+    return _fanout(_close_group, inst_id, size)
+
+def _refresh_group(srv: Dict, fs: List[Dict], deadline_at: float) -> List[Dict]:
+    path = "/api/v1/account/positions"
+    live = [f for f in fs if _has_keys(f)]
+    as_of = time.monotonic()
+    res = _ssh_curl_batch(srv, [_signed_req(f, "GET", path, None) for f in live],
+                          timeout=min(20, _remaining(deadline_at)))
+    out = {id(f): {"target": _target(f), "error": "missing-keys"} for f in fs}
+    for f, (st, txt) in zip(live, res):
+        try:
+            jj = json.loads(txt)
+        except Exception:
+            jj = {}
+        if st == 200 and str(jj.get("code")) == "0":
+            positions.apply_positions(_fkey(f), jj.get("data") or [], snapshot=True, as_of=as_of)
+            out[id(f)] = {"target": _target(f), "status": st}
+        else:
+            out[id(f)] = {"target": _target(f), "status": st, "error": "refresh-failed"}
+    return [out[id(f)] for f in fs]
+
+def refresh_positions() -> List[Dict]:
+    """모든 팔로워 포지션을 한 번에 갱신 (서버별 배치 GET)"""
+    return _fanout(_refresh_group)
+
 # ---------- WS Broadcaster ----------
+BROADCAST_QUEUE = int(os.environ.get("BROADCAST_QUEUE", "2000"))        # 전체 로그 큐 상한
+CLIENT_QUEUE = int(os.environ.get("CLIENT_QUEUE", "500"))               # 클라이언트별 송신 큐 상한
+CLIENT_SEND_TIMEOUT = float(os.environ.get("CLIENT_SEND_TIMEOUT", "5"))  # 한 프레임 전송이 이보다 오래 걸리면 끊음
+CLIENT_MAX_DROPS = int(os.environ.get("CLIENT_MAX_DROPS", "2000"))       # 연속으로 이만큼 밀리면 느린 클라이언트로 보고 끊음
+LOG_HISTORY = int(os.environ.get("LOG_HISTORY", "2000"))                 # 새 접속자에게 재생할 최근 로그 수 (링버퍼)
+BATCH_WINDOW = float(os.environ.get("BATCH_WINDOW", "0.05"))            # 이 시간 동안 모인 로그를 한 프레임으로
+BATCH_MAX = int(os.environ.get("BATCH_MAX", "200"))                     # 한 프레임 최대 로그 수
+
+class _Client:
+    """대시보드 소켓 1개 + 전용 송신 큐/태스크. 큐가 차면 오래된 것부터 버리고 건수만 모아서 알린다."""
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE)
+        self.dropped = 0          # 아직 알리지 않은 드롭 수
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, text: str) -> bool:
+        """False 면 너무 느려서 끊어야 하는 클라이언트"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped += 1
+            M_BCAST_DROP.inc("client")
+            if self.dropped >= CLIENT_MAX_DROPS:
+                return False
+        self.queue.put_nowait(text)
+        return True
+
 class Broadcaster:
+    """
+    로그를 대시보드 WS 들로 내보낸다.
+    - 전체 큐/클라이언트별 큐 모두 상한이 있어 로그 폭주가 메모리를 키우지 않는다
+    - JSON 직렬화는 이벤트당 1번, 클라이언트 전송은 각자 태스크에서 동시에
+    - 느린 클라이언트는 오래된 로그부터 버리고(건수는 한 줄로 요약) 계속 밀리면 끊는다
+    - 최근 LOG_HISTORY 건은 링버퍼에 남겨 새 접속자에게 먼저 재생 (since=seq 이후만 가능)
+    - 모든 항목에 단조 증가 seq 를 붙인다 → 같은 ms 에 찍힌 로그도 재접속 시 빠지지 않는다.
+      seq 는 프로세스마다 새로 시작하므로 boot 가 다르면 since 를 무시하고 전체 재생
+    - 실시간 로그는 BATCH_WINDOW 동안 모아 {"type":"batch","items":[...]} 한 프레임으로 보낸다
+    """
     def __init__(self):
-        self.clients: set[WebSocket] = set()
-        self.queue: asyncio.Queue = asyncio.Queue()
-    async def connect(self, ws: WebSocket):
-        await ws.accept(); self.clients.add(ws)
+        self.clients: Dict[WebSocket, _Client] = {}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=BROADCAST_QUEUE)
+        self.history: collections.deque = collections.deque(maxlen=LOG_HISTORY)
+        self.closing: set = set()   # 끊은 클라이언트의 close 태스크 (GC 방지)
+        self.boot = int(time.time() * 1000)
+        self._seq = itertools.count(1)
+    def replay(self, since: Optional[int] = None) -> List[Dict]:
+        if since is None:
+            return list(self.history)
+        return [it for it in self.history if it.get("seq", 0) > since]
+    async def connect(self, ws: WebSocket, since: Optional[int] = None, boot: Optional[int] = None):
+        await ws.accept()
+        c = _Client(ws)
+        if boot != self.boot:
+            since = None   # 서버 재시작 전 seq → 이어받을 수 없으니 전체 재생
+        # 스냅샷과 등록 사이에 await 가 없으므로 재생 ↔ 실시간 사이에 빠지거나 겹치는 로그가 없다
+        items = self.replay(since)
+        c.queue.put_nowait(json.dumps({"type":"replay","boot":self.boot,"items":items}, ensure_ascii=False))
+        c.task = asyncio.create_task(self._sender(c))
+        self.clients[ws] = c
     def disconnect(self, ws: WebSocket):
-        self.clients.discard(ws)
+        c = self.clients.pop(ws, None)
+        if c and c.task and c.task is not asyncio.current_task():
+            c.task.cancel()
+    def publish(self, item: Dict):
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            M_BCAST_DROP.inc("queue")
+        item["seq"] = next(self._seq)
+        self.queue.put_nowait(item)
     async def log(self, msg: str):
         print(msg)
-        await self.queue.put({"type":"log","ts":int(time.time()*1000),"msg":msg})
+        self.publish({"type":"log","ts":int(time.time()*1000),"msg":msg})
     async def loop(self):
         while True:
-            item = await self.queue.get()
-            dead=[]
-            for ws in list(self.clients):
-                try: await ws.send_text(json.dumps(item, ensure_ascii=False))
-                except: dead.append(ws)
-            for d in dead: self.disconnect(d)
+            batch = [await self.queue.get()]
+            if BATCH_WINDOW > 0:
+                await asyncio.sleep(BATCH_WINDOW)
+            while len(batch) < BATCH_MAX:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            self.history.extend(batch)
+            if len(batch) == 1:
+                text = json.dumps(batch[0], ensure_ascii=False)
+            else:
+                text = json.dumps({"type":"batch","items":batch}, ensure_ascii=False)
+            for ws, c in list(self.clients.items()):
+                if not c.offer(text):
+                    self._kick(c, "too-slow")
+            # 큐가 차 있으면 get() 이 양보하지 않으므로 송신 태스크들에 차례를 넘긴다
+            await asyncio.sleep(0)
+    async def _sender(self, c: _Client):
+        try:
+            while True:
+                text = await c.queue.get()
+                if c.dropped:
+                    notice = json.dumps({"type":"log","ts":int(time.time()*1000),
+                                         "msg":f"[BROADCAST] 전송 지연으로 로그 {c.dropped}건 생략"}, ensure_ascii=False)
+                    c.dropped = 0
+                    await asyncio.wait_for(c.ws.send_text(notice), CLIENT_SEND_TIMEOUT)
+                await asyncio.wait_for(c.ws.send_text(text), CLIENT_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._kick(c, "send-timeout")
+        except Exception:
+            self.disconnect(c.ws)
+    def _kick(self, c: _Client, reason: str):
+        # 등록 해제는 즉시, close 핸드셰이크는 별도 태스크에서 (막힌 소켓을 기다리느라 다른 클라이언트 전송이 멈추지 않게)
+        M_BCAST_KICK.inc(reason)
+        self.disconnect(c.ws)
+        t = asyncio.create_task(self._close(c.ws))
+        self.closing.add(t)
+        t.add_done_callback(self.closing.discard)
+        print(f"[BROADCAST] slow client disconnected ({reason})")
+    @staticmethod
+    async def _close(ws: WebSocket):
+        try:
+            await asyncio.wait_for(ws.close(code=1013), CLIENT_SEND_TIMEOUT)
+        except Exception:
+            pass
 
 broad = Broadcaster()
 
 # ---------- Master WS to Blockfin (로그인/구독) ----------
-WS_URL = "wss://openapi.blockfin.com/ws/private"
+WS_URL = os.environ.get("BLOCKFIN_WS_URL", "wss://openapi.blockfin.com/ws/private")
 listener_task: asyncio.Task | None = None
 should_stop = asyncio.Event()
 
@@ -362,6 +1227,320 @@ def close_position_forward(inst_id, size):
     # SSH 원격 curl
     return ssh_close_position(inst_id, size)
 
+# ---------- Fill dispatcher (WS 수신 ↔ 팔로워 실행 분리) ----------
+@dataclass
+class Fill:
+    reduce_only: bool
+    inst_id: str
+    side: str
+    size: str
+    price: Optional[str]
+    margin_mode: Optional[str]
+    order_type: str
+    recv_ts: float          # time.monotonic() 수신 시각
+    trace: Optional[latency.Trace] = None
+
+@dataclass
+class LaneJob:
+    """레인 작업 1건 = 팔로워 1명 × 체결 1건. 같은 batch 키(서버 + 체결)끼리는 실행 시점에 원격 호출 1회로 묶인다"""
+    batch: Hashable
+    srv: Dict
+    follower: Dict
+    run: Callable[[Dict, List[Dict]], List[Dict]]   # (srv, fs) → fs 순서대로 결과
+
+class LaneScheduler:
+    """
+    (팔로워, instId) 마다 FIFO 레인 하나. 같은 레인 안에서는 순서대로(진입 → 청산 역전 없음),
+    레인끼리는 LANE_WORKERS 스레드에서 병렬로 실행 → 느린/레이트리밋 걸린 계정은 자기 레인만 늦어진다.
+    배치는 실행 시점에: 지금 바로 실행 가능한 레인 머리들 중 batch 키가 같은 것만 모아 한 번에 보낸다.
+    앞 작업이 아직 안 끝난 레인은 그 배치에 끼지 않으므로 다른 팔로워를 기다리게 하지 않는다.
+    """
+    def __init__(self, workers: int = LANE_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="lane")
+        self.lanes: Dict[Tuple[str, str], collections.deque] = {}   # 머리 = 실행 중이거나 다음 차례
+        self.busy: set = set()
+        self.running: set = set()      # 실행 중인 배치 태스크
+        self._ready: List[Tuple[str, str]] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+
+    def submit(self, key: Tuple[str, str], job: LaneJob) -> asyncio.Future:
+        """결과(dict)는 반환된 Future 로 받는다."""
+        fut = asyncio.get_running_loop().create_future()
+        q = self.lanes.setdefault(key, collections.deque())
+        q.append((job, fut))
+        if len(q) == 1 and key not in self.busy:
+            self._mark_ready(key)
+        return fut
+
+    def _mark_ready(self, key: Tuple[str, str]):
+        self._ready.append(key)
+        if self._flush_handle is None:
+            # 같은 틱에 들어온 레인 머리(보통 체결 1건의 팔로워 전체)를 한 번에 모은다
+            self._flush_handle = asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        ready, self._ready = self._ready, []
+        groups: Dict[Hashable, List[Tuple[str, str]]] = {}
+        for key in ready:
+            job = self.lanes[key][0][0]
+            groups.setdefault(job.batch if FANOUT_BATCH else key, []).append(key)
+        for keys in groups.values():
+            self.busy.update(keys)
+            t = asyncio.create_task(self._run(keys))
+            self.running.add(t)
+            t.add_done_callback(self.running.discard)
+
+    async def _run(self, keys: List[Tuple[str, str]]):
+        heads = [self.lanes[k][0] for k in keys]
+        job0 = heads[0][0]
+        try:
+            res = await asyncio.get_running_loop().run_in_executor(
+                self.pool, job0.run, job0.srv, [j.follower for j, _ in heads])
+            for (_, fut), r in zip(heads, res):
+                if not fut.done(): fut.set_result(r)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            for _, fut in heads:
+                if not fut.done(): fut.set_exception(e)
+        for k in keys:
+            q = self.lanes.get(k)
+            self.busy.discard(k)
+            if not q:
+                continue
+            q.popleft()
+            if q:
+                self._mark_ready(k)
+            else:
+                self.lanes.pop(k, None)
+
+    def depths(self) -> Dict[str, int]:
+        """레인별 대기 수 (실행 중인 1건 포함)"""
+        return {f"{k[0]}|{k[1]}": len(q) for k, q in list(self.lanes.items())}
+
+    def stop(self):
+        for t in list(self.running):
+            t.cancel()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel(); self._flush_handle = None
+        # 대기/실행 중이던 작업의 Future 도 끝내야 _log_results / drain() 이 영원히 기다리지 않는다
+        for q in self.lanes.values():
+            for _, fut in q:
+                if not fut.done():
+                    fut.set_exception(asyncio.CancelledError())
+        self.lanes.clear(); self.busy.clear(); self._ready.clear()
+
+def _lane_job(fn, srv: Dict, fs: List[Dict], t0: float, trace: Optional[latency.Trace], *args) -> List[Dict]:
+    # 마감은 신호 시점 기준. 앞 작업 때문에 이미 마감을 넘겨 시작하는 건 건너뛰지 않고
+    # (진입 뒤 청산이 빠지면 안 되므로) 시작 시점부터 다시 FOLLOWER_DEADLINE 을 준다
+    deadline_at = t0 + FOLLOWER_DEADLINE
+    if deadline_at <= time.monotonic():
+        deadline_at = time.monotonic() + FOLLOWER_DEADLINE
+    return _timed(fn, srv, fs, t0, deadline_at, trace, *args)
+
+def _record_trace(fill: Fill, res: List[Dict]):
+    tr = fill.trace
+    if tr is None:
+        return
+    base = tr.stamps.get("recv", 0.0)
+    latency.stats.add_recent({
+        "trace": tr.id, "instId": fill.inst_id, "reduceOnly": fill.reduce_only,
+        "stamps": {k: round(v - base, 2) for k, v in tr.stamps.items()},
+        "followers": [{"target": r.get("target"), "server": r.get("server"), "status": r.get("status"),
+                       "error": r.get("error"), "ack_ms": r.get("ack_ms")} for r in res],
+    })
+
+class FillDispatcher:
+    """
+    master_session 은 체결을 큐에 넣기만 하고 바로 다음 WS 프레임을 읽는다.
+    실제 팔로워 전송(ssh, 블로킹)은 별도 스레드에서 실행되고, 결과 로그는 여기서 남긴다.
+    - DISPATCH_MODE=lanes : 체결을 팔로워별 작업으로 쪼개 LaneScheduler 에 넣는다
+                            (FANOUT_BATCH 면 실행 가능한 같은 서버 팔로워끼리 원격 호출 1회로 묶음)
+    - DISPATCH_MODE=fill  : 체결 단위로 하나씩 (서버별 배치 fan-out 사용)
+    어느 쪽이든 같은 팔로워·종목에 대해 청산이 진입을 앞지르지 않는다.
+    """
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dispatch")
+        self.lanes = LaneScheduler()
+        self.task: Optional[asyncio.Task] = None
+        self.pending: set = set()   # 레인 결과 대기 중인 _log_results 태스크
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+        self.lanes.stop()
+
+    def submit(self, fill: Fill) -> int:
+        self.queue.put_nowait(fill)
+        return self.queue.qsize()
+
+    def stats(self) -> Dict:
+        return {"mode": DISPATCH_MODE, "queue": self.queue.qsize(), "lanes": self.lanes.depths()}
+
+    async def _run(self):
+        while True:
+            fill = await self.queue.get()
+            if fill.trace is not None:
+                fill.trace.stamp("dispatch")
+                fill.trace.observe_between("dispatch", "decode", "dispatch")
+            try:
+                if DISPATCH_MODE == "lanes":
+                    self._fan_to_lanes(fill)
+                else:
+                    await self._execute(fill)
+            except Exception as e:
+                await broad.log(f"[DISPATCH ERROR] {fill.inst_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _fan_to_lanes(self, fill: Fill):
+        if fill.reduce_only:
+            fn, args = _close_group, (fill.inst_id, fill.size)
+        else:
+            fn, args = _place_group, (fill.inst_id, fill.margin_mode or "cross", fill.side,
+                                      fill.order_type, fill.price, fill.size)
+        def run(srv: Dict, fs: List[Dict]) -> List[Dict]:
+            return _lane_job(fn, srv, fs, fill.recv_ts, fill.trace, *args)
+        futs = []
+        for f, srv in _list_pairs_followers_servers():
+            job = LaneJob(batch=(SshPool.key(srv), id(fill)), srv=srv, follower=f, run=run)
+            futs.append(self.lanes.submit((_fkey(f), fill.inst_id), job))
+        t = asyncio.create_task(self._log_results(fill, futs))
+        self.pending.add(t)
+        t.add_done_callback(self.pending.discard)
+
+    async def drain(self):
+        """큐에 들어간 체결이 전부 팔로워 결과까지 끝날 때까지 대기 (재생/벤치용)"""
+        await self.queue.join()
+        while self.pending:
+            await asyncio.gather(*list(self.pending), return_exceptions=True)
+
+    async def _log_results(self, fill: Fill, futs: List[asyncio.Future]):
+        res = await asyncio.gather(*futs, return_exceptions=True)
+        res = [r if isinstance(r, dict) else {"error": repr(r)} for r in res]
+        _record_trace(fill, res)
+        tag = "CLOSE" if fill.reduce_only else "PLACE"
+        await broad.log(f"[FOLLOWERS {tag} RES] {json.dumps(res, ensure_ascii=False)[:900]}")
+
+    async def _execute(self, fill: Fill):
+        loop = asyncio.get_running_loop()
+        wait_ms = round((time.monotonic() - fill.recv_ts) * 1000, 1)
+
+        def run(fn, **kw):
+            with latency.bind(latency.Span(fill.trace, [])):
+                return fn(**kw)
+
+        if fill.reduce_only:
+            res = await loop.run_in_executor(self.pool, lambda: run(close_position_forward, inst_id=fill.inst_id, size=fill.size))
+            _record_trace(fill, res)
+            await broad.log(f"[FOLLOWERS CLOSE RES] queued={wait_ms}ms {json.dumps(res, ensure_ascii=False)[:900]}")
+        else:
+            res = await loop.run_in_executor(self.pool, lambda: run(
+                place_order_forward, inst_id=fill.inst_id, marginMode=fill.margin_mode or "cross", side=fill.side,
+                orderType=fill.order_type, price=fill.price, size=fill.size))
+            _record_trace(fill, res)
+            await broad.log(f"[FOLLOWERS PLACE RES] queued={wait_ms}ms {json.dumps(res, ensure_ascii=False)[:900]}")
+
+dispatcher = FillDispatcher()
+
+# ---------- 부분체결 합치기 (COALESCE_MS, 기본 끔) ----------
+def _fill_key(fill: Fill) -> Tuple:
+    # 지정가는 가격이 같은 것끼리만 (팔로워 주문이 그 가격으로 나가므로)
+    return (fill.inst_id, fill.side, fill.reduce_only, fill.order_type,
+            None if fill.order_type == "market" else fill.price)
+
+def _merge_fills(fills: List[Fill]) -> Fill:
+    first = fills[0]
+    price = first.price if first.order_type != "market" else (coalesce.vwap([(f.price, f.size) for f in fills]) or first.price)
+    merged = replace(first, size=coalesce.sum_sizes([f.size for f in fills]), price=price)
+    if merged.trace is not None:
+        merged.trace.stamp("coalesce")
+    return merged
+
+async def _emit_fill(fill: Fill, parts: List[Fill]):
+    depth = dispatcher.submit(fill)
+    if len(parts) > 1:
+        M_COALESCED.inc(amount=len(parts) - 1)
+        await broad.log(f"[COALESCE] {fill.inst_id} {'청산' if fill.reduce_only else fill.side} {len(parts)}건 → size={fill.size}"
+                        f"  (queue={depth}, trace={fill.trace.id if fill.trace else '-'})")
+
+coalescer = coalesce.Coalescer(coalesce.COALESCE_MS, _merge_fills, _emit_fill)
+
+def submit_fill(fill: Fill, co: Optional[coalesce.Coalescer] = None) -> Optional[int]:
+    """디스패처로 넘긴다. 합치기 창이 켜져 있으면 창이 끝날 때 넘어가므로 None (co: 재생 등 별도 합치기 버퍼)"""
+    co = co if co is not None else coalescer
+    if co is coalescer and co.window <= 0:
+        return dispatcher.submit(fill)
+    co.add(fill.inst_id, _fill_key(fill), fill)
+    return None
+
+def _exch_ts(order: Dict) -> Optional[float]:
+    """거래소 이벤트 시각(ms). 없거나 이상하면 None"""
+    for k in ("updateTime", "uTime", "fillTime", "createTime", "cTime"):
+        try:
+            v = float(order.get(k) or 0)
+        except Exception:
+            continue
+        if v > 0:
+            return v
+    return None
+
+frame_recorder: Optional[recorder.FrameRecorder] = recorder.FrameRecorder(RECORD_PATH) if RECORD_PATH else None
+
+# 재접속 후 재전송된 FILLED 로 같은 체결을 두 번 복사하지 않도록 (세션이 바뀌어도 유지)
+fill_dedup = FillDedup()
+
+async def handle_master_frame(msg, recv_ts: float, recv_ms: float, live: bool = True,
+                              dedup: Optional[FillDedup] = None, co: Optional[coalesce.Coalescer] = None) -> int:
+    """orders 채널 프레임 1개 파싱 → FILLED 는 디스패처로. 실시간 수신/녹화 재생 공용. 반환: 넘긴 체결 수"""
+    dedup = dedup if dedup is not None else fill_dedup
+    try:
+        data = json.loads(msg) if isinstance(msg, (str, bytes)) else None
+    except Exception:
+        await broad.log(f"[WS RAW] {repr(msg)}"); return 0
+    decode_ms = latency.now_ms()
+    if not isinstance(data, dict) or "data" not in data: return 0
+
+    n = 0
+    for order in data["data"]:
+        inst_id     = order.get("instId")
+        side        = (order.get("side") or "").lower()
+        order_state = (order.get("state") or "").upper()
+        size        = order.get("size") or "0"
+        price       = order.get("price")
+        margin_mode = order.get("marginMode")
+        order_type  = (order.get("orderType") or "market").lower()
+        reduce_only = str(order.get("reduceOnly","false")).lower()=="true"
+        await broad.log(f"[ORDER] {inst_id} {order_state} side={side} size={size} ro={reduce_only}")
+
+        if order_state == "FILLED":
+            if dedup.check(order):
+                M_DEDUP.inc()
+                await broad.log(f"[DEDUP] 중복 체결 무시: {inst_id} orderId={order.get('orderId')}")
+                continue
+            M_FILLS.inc("close" if reduce_only else "open")
+            # 재생 시 거래소 시각은 녹화 당시 값이라 exchange 단계는 집계하지 않는다
+            trace = latency.Trace(exch_ts=_exch_ts(order) if live else None)
+            trace.stamp("recv", recv_ms); trace.stamp("decode", decode_ms)
+            trace.observe_between("exchange", "exchange", "recv")
+            trace.observe_between("decode", "recv", "decode")
+            depth = submit_fill(Fill(reduce_only=reduce_only, inst_id=inst_id, side=side, size=size,
+                                     price=price, margin_mode=margin_mode, order_type=order_type,
+                                     recv_ts=recv_ts, trace=trace), co)
+            n += 1
+            q = depth if depth is not None else "coalescing"
+            if reduce_only:
+                await broad.log(f"[MASTER] 청산 신호: {inst_id} size={size}  (queue={q}, trace={trace.id})")
+            else:
+                await broad.log(f"[MASTER] 진입 신호: {inst_id} side={side} size={size} type={order_type}  (queue={q}, trace={trace.id})")
+    return n
+
 async def master_session():
     master_key, master_secret, passphrase = load_env()
     if not all([master_key, master_secret, passphrase]):
@@ -384,33 +1563,10 @@ async def master_session():
 
         while not should_stop.is_set():
             msg = await ws.recv()
-            try:
-                data = json.loads(msg) if isinstance(msg, (str, bytes)) else None
-            except Exception:
-                await broad.log(f"[WS RAW] {repr(msg)}"); continue
-            if not isinstance(data, dict) or "data" not in data: continue
-
-            for order in data["data"]:
-                inst_id     = order.get("instId")
-                side        = (order.get("side") or "").lower()
-                order_state = (order.get("state") or "").upper()
-                size        = order.get("size") or "0"
-                price       = order.get("price")
-                margin_mode = order.get("marginMode")
-                order_type  = (order.get("orderType") or "market").lower()
-                reduce_only = str(order.get("reduceOnly","false")).lower()=="true"
-                await broad.log(f"[ORDER] {inst_id} {order_state} side={side} size={size} ro={reduce_only}")
-
-                if order_state == "FILLED":
-                    if reduce_only:
-                        await broad.log(f"[MASTER] 청산 신호: {inst_id} size={size}")
-                        res = close_position_forward(inst_id=inst_id, size=size)
-                        await broad.log(f"[FOLLOWERS CLOSE RES] {json.dumps(res, ensure_ascii=False)[:900]}")
-                    else:
-                        await broad.log(f"[MASTER] 진입 신호: {inst_id} side={side} size={size} type={order_type}")
-                        res = place_order_forward(inst_id=inst_id, marginMode=margin_mode or "cross",
-                                                  side=side, orderType=order_type, price=price, size=size)
-                        await broad.log(f"[FOLLOWERS PLACE RES] {json.dumps(res, ensure_ascii=False)[:900]}")
+            recv_ts = time.monotonic(); recv_ms = latency.now_ms()
+            if frame_recorder is not None:
+                frame_recorder.write(recv_ms, msg)
+            await handle_master_frame(msg, recv_ts, recv_ms)
 
 async def master_loop():
     backoff = 1
@@ -422,8 +1578,125 @@ async def master_loop():
         except Exception as e:
             await broad.log(f"[WS ERROR] {e}")
         await asyncio.sleep(backoff); backoff = min(backoff*2, 30)
+        M_WS_RECONNECT.inc()
         await broad.log(f"[RECONNECT] backoff={backoff}s")
 
+def _is_mock_base(url: str) -> bool:
+    """BASE_URL 호스트가 루프백이거나 REPLAY_MOCK_HOSTS 에 있으면 mock 으로 본다 (그 외 호스트는 전부 실거래소 취급)"""
+    host = (urllib.parse.urlsplit(url).hostname or "").lower()
+    if not host:
+        return False
+    if host == "localhost" or host in REPLAY_MOCK_HOSTS:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def replay_blocked(dry_run: bool = False) -> Optional[str]:
+    """재생 주문이 실거래소로 나갈 수 있으면 거절 사유. dry_run / mock BASE_URL / REPLAY_ALLOW_LIVE=1 이면 None"""
+    if dry_run or _is_mock_base(BASE_URL) or REPLAY_ALLOW_LIVE:
+        return None
+    return "실거래소 대상 재생 거부: dry_run 을 쓰거나 BLOCKFIN_BASE_URL 을 루프백/REPLAY_MOCK_HOSTS mock 으로 (강제: REPLAY_ALLOW_LIVE=1)"
+
+def parse_speed(v) -> Optional[float]:
+    """재생 배속. 숫자가 아니거나 inf/nan 이면 None (0 이하는 대기 없음으로 허용)"""
+    try:
+        speed = float(v)
+    except (TypeError, ValueError):
+        return None
+    return speed if math.isfinite(speed) else None
+
+async def replay_recording(path: str, speed: float = 1.0, dry_run: bool = False) -> Dict:
+    """
+    녹화 파일을 실시간 수신과 같은 경로(handle_master_frame → dispatcher)로 흘려보낸다.
+    합치기 버퍼/중복 제거는 재생 전용 (실시간 대기 묶음을 건드리지 않는다). dry_run 이면 파싱/합치기까지만 하고 주문은 안 보낸다.
+    """
+    reason = replay_blocked(dry_run)
+    if reason:
+        raise PermissionError(reason)
+    t0 = time.monotonic()
+    frames = fills = orders = 0
+    dedup = FillDedup()   # 재생마다 새로 (실시간 수신 기록과 섞이지 않게)
+
+    def count_only(fill: Fill, parts: List[Fill]):
+        nonlocal orders
+        orders += 1
+
+    co = coalesce.Coalescer(coalesce.COALESCE_MS, _merge_fills, count_only if dry_run else _emit_fill)
+    async for _, raw in recorder.replay(path, speed):
+        fills += await handle_master_frame(raw, time.monotonic(), latency.now_ms(), live=False, dedup=dedup, co=co)
+        frames += 1
+    fed = time.monotonic() - t0
+    co.flush_all()
+    await asyncio.sleep(0)
+    if not dry_run:
+        await dispatcher.drain()
+    total = time.monotonic() - t0
+    res = {"path": path, "speed": speed, "dry_run": dry_run, "frames": frames, "fills": fills,
+           "feed_sec": round(fed, 3), "total_sec": round(total, 3),
+           "fills_per_sec": round(fills / total, 1) if total > 0 else None}
+    if dry_run:
+        res["orders"] = orders   # 합치기 후 실제로 나갔을 주문 수
+    await broad.log(f"[REPLAY] {json.dumps(res, ensure_ascii=False)}")
+    return res
+
+# ---------- Follower position feeds ----------
+position_tasks: List[asyncio.Task] = []
+
+async def position_refresh_loop():
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            res = await loop.run_in_executor(None, refresh_positions)
+            bad = [r for r in res if r.get("error")]
+            if bad:
+                await broad.log(f"[POS CACHE] refresh 실패 {len(bad)}/{len(res)}: {json.dumps(bad, ensure_ascii=False)[:300]}")
+        except Exception as e:
+            await broad.log(f"[POS CACHE] refresh error: {e}")
+        await asyncio.sleep(POSITION_REFRESH_SEC)
+
+async def follower_position_session(f: Dict):
+    async with websockets.connect(WS_URL, ping_interval=20, ping_timeout=20, close_timeout=10) as ws:
+        sign, ts, nonce = _sign_login(f["secret"])
+        await ws.send(json.dumps({"op":"login","args":[{"apiKey":f["key"],"passphrase":f["passphrase"],"timestamp":ts,"sign":sign,"nonce":nonce}]}))
+        resp = await ws.recv()
+        try:
+            if json.loads(resp).get("event") == "error":
+                await broad.log(f"[POS WS] {_target(f)} 로그인 실패: {resp}"); await asyncio.sleep(30); return
+        except Exception: pass
+        await ws.send(json.dumps({"op":"subscribe","args":[{"channel":"positions"}]}))
+        while True:
+            msg = await ws.recv()
+            try:
+                data = json.loads(msg)
+            except Exception:
+                continue
+            if isinstance(data, dict) and data.get("arg", {}).get("channel") == "positions" and "data" in data:
+                positions.apply_positions(_fkey(f), data["data"])
+
+async def follower_position_loop(f: Dict):
+    backoff = 1
+    while True:
+        try:
+            await follower_position_session(f); backoff = 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await broad.log(f"[POS WS] {_target(f)} error: {e}")
+        await asyncio.sleep(backoff); backoff = min(backoff*2, 30)
+
+def restart_position_feeds():
+    for t in position_tasks:
+        t.cancel()
+    position_tasks.clear()
+    if POSITION_REFRESH_SEC > 0:
+        position_tasks.append(asyncio.create_task(position_refresh_loop()))
+    if POSITION_WS:
+        for f in load_followers_config():
+            if _has_keys(f):
+                position_tasks.append(asyncio.create_task(follower_position_loop(f)))
+
 # ---------- FastAPI ----------
 app = FastAPI(title="Blockfin Master (SSH CURL forward)", version="1.7")
 app.add_middleware(
@@ -435,12 +1708,21 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 @app.on_event("startup")
 async def on_start():
     asyncio.create_task(broad.loop())
+    asyncio.create_task(loop_lag_monitor())
+    dispatcher.start()
     # 상태 요약
+    ensure_servers_config(); registry.invalidate()
     cfg = load_servers_config()
-    await broad.log(f"[SSH] servers.json loaded: {len(cfg.get('servers', []))} server(s)  mode={FORWARD_MODE}")
+    if FORWARD_MODE == "ssh_agent":
+        asyncio.get_running_loop().run_in_executor(None, start_agents, cfg.get("servers", []))
+    elif SSH_MUX:
+        asyncio.get_running_loop().run_in_executor(None, ssh_pool.warmup, cfg.get("servers", []))
+    await broad.log(f"[SSH] servers.json loaded: {len(cfg.get('servers', []))} server(s)  mode={FORWARD_MODE}  "
+                    f"fanout={FANOUT_MODE}(workers={FANOUT_WORKERS}, deadline={FOLLOWER_DEADLINE}s, batch={FANOUT_BATCH})  mux={SSH_MUX}  dispatch={DISPATCH_MODE}")
     global listener_task, should_stop
     should_stop.clear()
     listener_task = asyncio.create_task(master_loop())
+    restart_position_feeds()
     print(f"[MASTER] boot OK, http://0.0.0.0:8090  FORWARD_MODE={FORWARD_MODE}")
 
 @app.on_event("shutdown")
@@ -448,6 +1730,12 @@ async def on_stop():
     global listener_task
     should_stop.set()
     if listener_task: listener_task.cancel()
+    for t in position_tasks: t.cancel()
+    dispatcher.stop()
+    if frame_recorder is not None:
+        frame_recorder.close()
+    stop_agents()
+    ssh_pool.close_all(load_servers_config().get("servers", []))
 
 # ---- Auth (cookie) ----
 SESSION_COOKIE = "bf_session"
@@ -516,6 +1804,8 @@ async def api_save_env(request: Request):
         global listener_task, should_stop
         should_stop.set(); await asyncio.sleep(0.2); should_stop.clear()
         listener_task = asyncio.create_task(master_loop())
+        if followers_text is not None:
+            restart_position_feeds()
         await broad.log("[CONFIG] 저장 및 리스너 재시작 완료")
         return {"ok": True}
     except Exception as e:
@@ -536,6 +1826,45 @@ async def api_upload_env(request: Request, file: UploadFile = File(...)):
     except Exception as e:
         return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
 
+# ---- Dispatch 상태 (레인별 대기 수) ----
+@app.get("/api/dispatch")
+async def api_dispatch(request: Request):
+    if not require_auth(request): return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    return {"ok": True, **dispatcher.stats()}
+
+# ---- 녹화 재생 (팔로워로 실제 전송되므로 모의 거래소/테스트 계정에서만) ----
+@app.post("/api/replay")
+async def api_replay(request: Request):
+    if not require_auth(request): return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    data = await request.json()
+    path = data.get("path") or ""
+    if not os.path.isfile(path):
+        return JSONResponse({"ok": False, "error": f"녹화 파일 없음: {path}"}, status_code=400)
+    speed = parse_speed(data.get("speed", 1.0))
+    if speed is None:
+        return JSONResponse({"ok": False, "error": f"speed 는 숫자여야 함: {data.get('speed')!r}"}, status_code=400)
+    dry_run = bool(data.get("dry_run"))
+    reason = replay_blocked(dry_run)
+    if reason:
+        return JSONResponse({"ok": False, "error": reason}, status_code=403)
+    if data.get("wait"):
+        return {"ok": True, **(await replay_recording(path, speed, dry_run))}
+    asyncio.create_task(replay_recording(path, speed, dry_run))
+    return {"ok": True, "started": path, "speed": speed, "dry_run": dry_run}
+
+# ---- 지연 통계 (단계/팔로워/서버별 p50·p95·p99) ----
+@app.get("/api/latency")
+async def api_latency(request: Request):
+    if not require_auth(request): return JSONResponse({"ok": False, "error": "unauthorized"}, status_code=401)
+    return {"ok": True, **latency.stats.snapshot()}
+
+# ---- Prometheus ----
+@app.get("/metrics")
+async def prom_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization", "") != f"Bearer {METRICS_TOKEN}":
+        return PlainTextResponse("unauthorized\n", status_code=401)
+    return PlainTextResponse(prom.render(), media_type=metrics.CONTENT_TYPE)
+
 # ---- WebSocket for logs ----
 @app.websocket("/ws")
 async def ws_endpoint(ws: WebSocket):
@@ -544,13 +1873,47 @@ async def ws_endpoint(ws: WebSocket):
             await ws.close(); return
     except:
         pass
-    await broad.connect(ws)
+    try:
+        since = int(ws.query_params.get("since")) if ws.query_params.get("since") else None
+        boot = int(ws.query_params.get("boot")) if ws.query_params.get("boot") else None
+    except (TypeError, ValueError):
+        since = boot = None
+    await broad.connect(ws, since=since, boot=boot)
     try:
         await broad.log("[CLIENT] connected")
         while True:
             await ws.receive_text()
     except WebSocketDisconnect:
+        pass
+    except RuntimeError:
+        # 느린 클라이언트로 서버측에서 close 한 경우
+        pass
+    finally:
         broad.disconnect(ws)
 
+async def _replay_main(path: str, speed: float, dry_run: bool = False):
+    reason = replay_blocked(dry_run)
+    if reason:
+        print(f"[REPLAY] {reason}"); return
+    dispatcher.start()
+    ensure_servers_config(); registry.invalidate()
+    if FORWARD_MODE == "ssh_agent":
+        await asyncio.get_running_loop().run_in_executor(None, start_agents, load_servers_config().get("servers", []))
+    try:
+        res = await replay_recording(path, speed, dry_run)
+        res["latency"] = latency.stats.snapshot()["stages"]
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+    finally:
+        dispatcher.stop(); stop_agents()
+
 if __name__ == "__main__":
-    uvicorn.run("server:app", host="0.0.0.0", port=8090, reload=True)
+    # python server.py --replay rec.jsonl [--speed 10 | --speed 0(최대)] [--dry-run]
+    if "--replay" in sys.argv:
+        i = sys.argv.index("--replay")
+        raw = sys.argv[sys.argv.index("--speed") + 1] if "--speed" in sys.argv[:-1] else "1"
+        speed = parse_speed(raw)
+        if speed is None:
+            sys.exit(f"--speed 는 숫자여야 함: {raw!r}")
+        asyncio.run(_replay_main(sys.argv[i + 1], speed, "--dry-run" in sys.argv))
+    else:
+        uvicorn.run("server:app", host="0.0.0.0", port=8090, reload=True)